@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарки слоя базы данных, маршрутизации callback-запросов и клавиатур
+
+Запуск: python benchmark.py
+"""
+
+import asyncio
+import inspect
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.utils.payload import prepare_arg
+
+import keyboards
+
+from callback_data import (
+    VIEW_ORDER, WRITE_ORDER_MESSAGE, ORDER_STATUS, REVIEW_ORDER, RATE_ORDER,
+    ADMIN_ORDER, ADMIN_STATUS, ADMIN_MESSAGE, ADMIN_COMMENT, ADMIN_BACK_TO_ORDERS,
+    ORDERS_PAGE, BROADCAST_CONFIRM, BROADCAST_CANCEL
+)
+from callback_router import CallbackRouter
+from database import AsyncDatabase, Database, OrderCache
+from models import Order
+
+
+# Заполнение тестовой БД
+def fill_database(db: Database, users: int, orders_per_user: int, messages_per_order: int):
+    for user_id in range(1, users + 1):
+        db.add_user(user_id, f"user{user_id}", f"Имя {user_id}", "")
+        for _ in range(orders_per_user):
+            order_id = db.create_order(user_id, f"Заявка пользователя {user_id}")
+            for i in range(messages_per_order):
+                db.add_message(order_id, user_id, f"Сообщение {i}", i % 2 == 1)
+
+
+# Замер времени вызова функции
+def measure(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+# Сравнение подключения на каждый вызов и пула подключений
+def bench_connections(iterations: int = 2000):
+    print(f"Подключение на вызов vs пул подключений ({iterations} вызовов, мкс/вызов)")
+    print(f"{'метод':<22}{'на вызов':>12}{'пул':>12}{'ускорение':>12}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        pooled = Database(path, pooled=True)
+        fill_database(pooled, users=200, orders_per_user=5, messages_per_order=4)
+
+        cases = {
+            'get_user': lambda db, i: db.get_user(i % 200 + 1),
+            'get_order': lambda db, i: db.get_order(i % 1000 + 1),
+            'get_user_orders': lambda db, i: db.get_user_orders(i % 200 + 1),
+            'get_user_summary': lambda db, i: db.get_user_summary(i % 200 + 1),
+            'get_order_messages': lambda db, i: db.get_order_messages(i % 1000 + 1),
+            'get_messages_page': lambda db, i: db.get_messages_page(i % 1000 + 1),
+            'get_statistics': lambda db, i: db.get_statistics(),
+            'add_message': lambda db, i: db.add_message(i % 1000 + 1, 1, "bench"),
+        }
+
+        per_call = Database(path, pooled=False)
+
+        # Сравниваются подключения, поэтому кэш заявок отключен
+        for db in (pooled, per_call):
+            db.order_cache = OrderCache(maxsize=0)
+
+        for name, case in cases.items():
+            plain_time = measure(lambda i: case(per_call, i), iterations)
+            pooled_time = measure(lambda i: case(pooled, i), iterations)
+            print(f"{name:<22}{plain_time:>12.1f}{pooled_time:>12.1f}{plain_time / pooled_time:>11.1f}x")
+
+        pooled.close()
+    print()
+
+
+# Всплеск сообщений от многих пользователей: транзакция на вставку vs групповая запись
+async def bench_group_commit(bursts: int = 20, burst_size: int = 200):
+    total = bursts * burst_size
+    print(f"add_message всплесками по {burst_size} ({total} вставок, вставок/с)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(os.path.join(tmp, "bench.db"))
+        fill_database(db.db, users=200, orders_per_user=5, messages_per_order=0)
+
+        async def run(add_message) -> float:
+            start = time.perf_counter()
+            for burst in range(bursts):
+                await asyncio.gather(*(
+                    add_message(i % 1000 + 1, 1, f"Сообщение {burst}.{i}") for i in range(burst_size)
+                ))
+            return total / (time.perf_counter() - start)
+
+        # Каждая вставка - отдельная транзакция в пуле потоков (как до очереди)
+        single_rate = await run(lambda *args: db._run(db.db.add_message, *args))
+        batched_rate = await run(db.add_message)
+
+        print(f"{'транзакция на вставку':<22}{single_rate:>12.0f}")
+        print(f"{'групповая запись':<22}{batched_rate:>12.0f}")
+        print(f"Ускорение: {batched_rate / single_rate:.1f}x")
+
+        # Новая заявка: заявка и первое сообщение
+        async def run_orders(create_order) -> float:
+            start = time.perf_counter()
+            for burst in range(bursts):
+                await asyncio.gather(*(
+                    create_order(i % 200 + 1, f"Заявка {burst}.{i}") for i in range(burst_size)
+                ))
+            return total / (time.perf_counter() - start)
+
+        async def create_order_single(user_id: int, description: str):
+            # Как до очереди: две транзакции подряд
+            order_id = await db._run(db.db.create_order, user_id, description)
+            await db._run(db.db.add_message, order_id, user_id, description)
+
+        async def create_order_separate(user_id: int, description: str):
+            # Через очередь, но двумя вставками (каждая ждет своей пачки)
+            order_id = await db.create_order(user_id, description)
+            await db.add_message(order_id, user_id, description)
+
+        print(f"Новые заявки всплесками по {burst_size} ({total} заявок, заявок/с)")
+        single_rate = await run_orders(create_order_single)
+        separate_rate = await run_orders(create_order_separate)
+        batched_rate = await run_orders(db.create_order_with_message)
+
+        print(f"{'транзакция на вставку':<22}{single_rate:>12.0f}")
+        print(f"{'две вставки в очереди':<22}{separate_rate:>12.0f}")
+        print(f"{'заявка с сообщением':<22}{batched_rate:>12.0f}")
+        print(f"Ускорение: {batched_rate / single_rate:.1f}x")
+
+        await db.close()
+    print()
+
+
+# Полный список заявок: словарь на строку vs запись Order
+def bench_records(users: int = 10_000, orders_per_user: int = 10, iterations: int = 3):
+    total = users * orders_per_user
+    print(f"Список из {total} заявок: словари vs записи Order")
+    print(f"{'формат':<22}{'мс/список':>12}{'память, МБ':>12}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        db.write_batch([('add_user', (user_id, f"user{user_id}", f"Имя {user_id}", "")) for user_id in range(1, users + 1)])
+        db.write_batch([
+            ('create_order', (user_id, f"Заявка пользователя {user_id}", ""))
+            for user_id in range(1, users + 1) for _ in range(orders_per_user)
+        ])
+
+        # Прежний способ: строка копируется в словарь с теми же ключами
+        def as_dicts():
+            with db._reader() as conn:
+                rows = conn.execute(f"""
+                    SELECT {Order.COLUMNS}
+                    FROM orders o
+                    JOIN users u ON o.user_id = u.user_id
+                    ORDER BY o.created_at DESC
+                """).fetchall()
+            return [dict(zip(Order._fields, row)) for row in rows]
+
+        cases = {
+            'словари': as_dicts,
+            'записи Order': db.get_all_orders,
+        }
+
+        for name, fetch in cases.items():
+            elapsed = measure(lambda i: fetch(), iterations) / 1000
+
+            tracemalloc.start()
+            orders = fetch()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            assert len(orders) == total
+            del orders
+
+            print(f"{name:<22}{elapsed:>12.1f}{size / 1024 / 1024:>12.1f}")
+
+        db.close()
+    print()
+
+
+# Полнотекстовый поиск по заявкам и переписке на большой базе
+# Словарь из 16 слов - худший случай: каждое слово есть примерно в половине сообщений
+def bench_search(orders: int = 20_000, messages: int = 300_000, iterations: int = 50):
+    words = ["бот", "магазин", "оплата", "интеграция", "каталог", "запись", "салон", "доставка",
+             "shopify", "crm", "api", "рассылка", "кабинет", "отчет", "склад", "telegram"]
+    rng = random.Random(1)
+
+    print(f"Поиск: {orders} заявок, {messages} сообщений (мс/запрос)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        db.write_batch([('add_user', (user_id, f"user{user_id}", f"Имя {user_id}", "")) for user_id in range(1, 1001)])
+        db.write_batch([
+            ('create_order', (order_id % 1000 + 1, " ".join(rng.choices(words, k=6)), ""))
+            for order_id in range(orders)
+        ])
+        db.write_batch([
+            ('add_message', (rng.randint(1, orders), 1, " ".join(rng.choices(words, k=12)) + f" сообщение{i}"))
+            for i in range(messages)
+        ])
+
+        cases = {
+            'частое слово': "бот",
+            'два слова': "оплата склад",
+            'префикс': "интегр",
+            'редкое слово': "сообщение123456",
+            'нет совпадений': "самолет",
+        }
+
+        print(f"{'':<22}{'поиск':>12}{'страница':>12}")
+        for name, query in cases.items():
+            search_time = measure(lambda i: db.search_orders(query), iterations) / 1000
+            matches = db.search_orders(query)['matches']
+            page_time = measure(lambda i: db.get_order_hits(query, matches[i % 4 * 5:i % 4 * 5 + 5]), iterations) / 1000
+            print(f"{name:<22}{search_time:>12.2f}{page_time:>12.2f}")
+
+        db.close()
+    print()
+
+
+# Сравнение цепочки фильтров startswith и префиксного роутера
+async def bench_callback_routing(iterations: int = 5000):
+    async def handler(callback, **kwargs):
+        pass
+
+    def chain_handler(parse):
+        # Прежние обработчики сами разбирали callback.data
+        async def wrapper(callback):
+            parse(callback.data)
+        return wrapper
+
+    bot = Bot("123456:BENCHMARK")
+
+    # Цепочка в порядке прежней регистрации
+    chain = Dispatcher(bot)
+    for check, parse in [
+        (lambda c: c.data.startswith('admin_order_'), lambda d: int(d.split("_")[2])),
+        (lambda c: c.data.startswith('admin_status_'), lambda d: (int(d.split("_")[2]), d.split("_")[3])),
+        (lambda c: c.data.startswith('admin_comment_'), lambda d: int(d.split("_")[2])),
+        (lambda c: c.data.startswith('admin_message_'), lambda d: int(d.split("_")[2])),
+        (lambda c: c.data == 'admin_back_to_orders', lambda d: None),
+        (lambda c: c.data.startswith('orders_'), lambda d: d.split("_", 3)),
+        (lambda c: c.data in ['broadcast_confirm', 'broadcast_cancel'], lambda d: None),
+        (lambda c: c.data.startswith('view_order_'), lambda d: int(d.split("_")[2])),
+        (lambda c: c.data.startswith('message_'), lambda d: int(d.split("_")[1])),
+        (lambda c: c.data.startswith('status_'), lambda d: int(d.split("_")[1])),
+        (lambda c: c.data.startswith('review_'), lambda d: int(d.split("_")[1])),
+        (lambda c: c.data.startswith('rate_'), lambda d: (int(d.split("_")[1]), int(d.split("_")[2]))),
+    ]:
+        chain.register_callback_query_handler(chain_handler(parse), check)
+
+    routed = Dispatcher(bot)
+    router = CallbackRouter()
+    for action in (VIEW_ORDER, WRITE_ORDER_MESSAGE, ORDER_STATUS, REVIEW_ORDER, RATE_ORDER,
+                   ADMIN_ORDER, ADMIN_STATUS, ADMIN_MESSAGE, ADMIN_COMMENT, ADMIN_BACK_TO_ORDERS,
+                   ORDERS_PAGE, BROADCAST_CONFIRM, BROADCAST_CANCEL):
+        router.register(action, handler)
+    router.setup(routed)
+
+    # (прежний формат, новый формат) для одной и той же кнопки
+    samples = [
+        ('admin_order_1042', ADMIN_ORDER.new(1042)),
+        ('admin_status_1042_in_progress', ADMIN_STATUS.new(1042, 'in_progress')),
+        ('admin_back_to_orders', ADMIN_BACK_TO_ORDERS.new()),
+        ('orders_next_1042_all', ORDERS_PAGE.new('next', 1042, 'all')),
+        ('broadcast_confirm', BROADCAST_CONFIRM.new()),
+        ('view_order_1042', VIEW_ORDER.new(1042)),
+        ('message_1042', WRITE_ORDER_MESSAGE.new(1042)),
+        ('status_1042', ORDER_STATUS.new(1042)),
+        ('review_1042', REVIEW_ORDER.new(1042)),
+        ('rate_1042_5', RATE_ORDER.new(1042, 5)),
+    ]
+    user = {'id': 1, 'is_bot': False, 'first_name': 'bench'}
+    types.User.set_current(types.User(**user))
+
+    async def measure_dispatch(dp: Dispatcher, data: str) -> float:
+        callback = types.CallbackQuery(id="1", chat_instance="1", data=data, **{'from': user})
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await dp.callback_query_handlers.notify(callback)
+        return (time.perf_counter() - start) / iterations * 1_000_000
+
+    print(f"Маршрутизация callback через диспетчер ({iterations} вызовов, мкс/вызов)")
+    print(f"{'callback_data':<32}{'фильтры':>10}{'новый формат':>14}{'роутер':>10}")
+
+    for old_data, data in samples:
+        chain_time = await measure_dispatch(chain, old_data)
+        router_time = await measure_dispatch(routed, data)
+        print(f"{old_data:<32}{chain_time:>10.1f}{data:>14}{router_time:>10.1f}")
+
+    print()
+
+
+# Повторные просмотры "горячих" заявок: запрос к БД vs кэш заявок
+def bench_order_cache(iterations: int = 20_000, hot_orders: int = 50):
+    print(f"get_order для {hot_orders} часто открываемых заявок ({iterations} вызовов, мкс/вызов)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        fill_database(db, users=200, orders_per_user=5, messages_per_order=0)
+
+        cache = db.order_cache
+        db.order_cache = OrderCache(maxsize=0)
+        query_time = measure(lambda i: db.get_order(i % hot_orders + 1), iterations)
+
+        db.order_cache = cache
+        cached_time = measure(lambda i: db.get_order(i % hot_orders + 1), iterations)
+
+        print(f"{'запрос к БД':<22}{query_time:>12.1f}")
+        print(f"{'кэш':<22}{cached_time:>12.1f}")
+        print(f"Счетчики кэша: {cache.stats()}")
+
+        db.close()
+    print()
+
+
+# Сборка и сериализация клавиатуры на каждый ответ vs кэш готового JSON
+def bench_keyboards(iterations: int = 20_000):
+    cases = {
+        'main_menu': (keyboards.main_menu, ()),
+        'admin_main_menu': (keyboards.admin_main_menu, ()),
+        'rating_buttons': (keyboards.rating_buttons, (1042,)),
+        'order_inline_buttons': (keyboards.order_inline_buttons, (1042,)),
+    }
+
+    print(f"Клавиатуры: сборка + JSON vs кэш ({iterations} вызовов, мкс/вызов)")
+    print(f"{'клавиатура':<22}{'сборка':>12}{'кэш':>12}")
+
+    for name, (cached, args) in cases.items():
+        build = inspect.unwrap(cached)
+        build_time = measure(lambda i: prepare_arg(build(*args)), iterations)
+        cached_time = measure(lambda i: prepare_arg(cached(*args)), iterations)
+        print(f"{name:<22}{build_time:>12.2f}{cached_time:>12.2f}")
+    print()
+
+
+if __name__ == '__main__':
+    bench_connections()
+    bench_order_cache()
+    bench_records()
+    bench_search()
+    asyncio.run(bench_group_commit())
+    asyncio.run(bench_callback_routing())
+    bench_keyboards()
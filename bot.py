@@ -7,12 +7,19 @@ Telegram бот для продажи услуг по созданию бото
 
 import logging
 from aiogram import Bot, Dispatcher, executor
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.types import BotCommand
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, DB_NAME, USE_WEBHOOK
+from database import AsyncDatabase
+from fsm_storage import SQLiteStorage
+from known_users import KnownUsers
+from broadcast import BroadcastEngine
+from middlewares import DependencyMiddleware
+from callback_router import CallbackRouter
 from handlers_user import register_user_handlers
 from handlers_admin import register_admin_handlers
+from notifications import NotificationQueue
+from webhook import start_webhook
 
 
 # Настройка логирования
@@ -24,8 +31,19 @@ logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
 bot = Bot(token=BOT_TOKEN, parse_mode='HTML')
-storage = MemoryStorage()
+
+# Единственный экземпляр БД на все приложение (передается в обработчики через middleware)
+db = AsyncDatabase(DB_NAME)
+broadcast_engine = BroadcastEngine(db)
+known_users = KnownUsers(db)
+# Очередь уведомлений (воркеры запускаются в on_startup)
+notifier = NotificationQueue()
+
+storage = SQLiteStorage(db)
 dp = Dispatcher(bot, storage=storage)
+dp.middleware.setup(DependencyMiddleware(
+    db=db, broadcast_engine=broadcast_engine, known_users=known_users, notifier=notifier
+))
 
 
 # Установка команд бота
@@ -45,6 +63,8 @@ async def on_startup(dp):
     """Действия при запуске бота"""
     logger.info("Бот запускается...")
     await set_bot_commands()
+    await notifier.start(dp.bot, db)
+    await broadcast_engine.resume(dp.bot)
     logger.info("Бот успешно запущен!")
 
 
@@ -52,18 +72,32 @@ async def on_startup(dp):
 async def on_shutdown(dp):
     """Действия при остановке бота"""
     logger.info("Бот останавливается...")
+    # Сначала прекращаем прием обновлений, чтобы обработчики не обращались к закрытым сервисам
+    if dp.is_polling():
+        dp.stop_polling()
+        await dp.wait_closed()
+    await broadcast_engine.stop()
+    await notifier.stop()
+    await known_users.close()
     await dp.storage.close()
     await dp.storage.wait_closed()
+    # БД закрывается последней: ее используют все сервисы выше
+    await db.close()
     logger.info("Бот остановлен")
 
 
 # Регистрация обработчиков
 def register_all_handlers(dp: Dispatcher):
     """Регистрация всех обработчиков"""
+    # Все callback-запросы разбирает один роутер (приоритет - по длине префикса)
+    router = CallbackRouter()
+
     # Сначала регистрируем админские обработчики (приоритет выше)
-    register_admin_handlers(dp)
+    register_admin_handlers(dp, router)
     # Затем пользовательские
-    register_user_handlers(dp)
+    register_user_handlers(dp, router)
+
+    router.setup(dp)
 
 
 # Главная функция
@@ -73,13 +107,17 @@ def main():
     register_all_handlers(dp)
 
     try:
-        logger.info("Запуск polling...")
-        executor.start_polling(
-            dp,
-            on_startup=on_startup,
-            on_shutdown=on_shutdown,
-            skip_updates=True  # Пропускаем накопившиеся обновления
-        )
+        if USE_WEBHOOK:
+            logger.info("Запуск webhook...")
+            start_webhook(dp, on_startup=on_startup, on_shutdown=on_shutdown)
+        else:
+            logger.info("Запуск polling...")
+            executor.start_polling(
+                dp,
+                on_startup=on_startup,
+                on_shutdown=on_shutdown,
+                skip_updates=True  # Пропускаем накопившиеся обновления
+            )
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
 
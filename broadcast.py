@@ -0,0 +1,179 @@
+"""
+Рассылка сообщений всем пользователям
+
+Отправка идет параллельно под общим ограничителем скорости, прогресс
+сохраняется в БД после каждой порции, поэтому прерванная рассылка
+продолжается с места остановки после перезапуска бота.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from aiogram import Bot
+from aiogram.utils.exceptions import MessageNotModified, TelegramAPIError
+
+from config import (
+    BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH_SIZE,
+    BROADCAST_MAX_ATTEMPTS, BROADCAST_RETRY_DELAY, BROADCAST_PROGRESS_INTERVAL
+)
+from database import AsyncDatabase
+from delivery import send_with_retry
+from keyboards import admin_main_menu
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Общий ограничитель скорости отправки (token bucket)"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Ожидание разрешения на отправку одного сообщения"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Остановка всех отправок (ответ RetryAfter от Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        # Токены снова накапливаются только после окончания паузы
+        self._updated = self._paused_until
+
+
+class BroadcastEngine:
+    """Выполнение и возобновление рассылок"""
+
+    def __init__(self, db: AsyncDatabase,
+                 rate: float = BROADCAST_RATE,
+                 concurrency: int = BROADCAST_CONCURRENCY,
+                 batch_size: int = BROADCAST_BATCH_SIZE):
+        self.db = db
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._tasks = set()
+
+    async def start(self, bot: Bot, text: str, chat_id: int, message_id: int) -> int:
+        """Создание задания рассылки и запуск в фоне"""
+        total = await self.db.count_users()
+        broadcast_id = await self.db.create_broadcast(text, total, chat_id, message_id)
+
+        self._spawn(bot, {
+            'broadcast_id': broadcast_id,
+            'text': text,
+            'cursor': 0,
+            'total': total,
+            'sent': 0,
+            'failed': 0,
+            'chat_id': chat_id,
+            'message_id': message_id
+        })
+        return broadcast_id
+
+    async def resume(self, bot: Bot):
+        """Возобновление рассылок, прерванных остановкой бота"""
+        for job in await self.db.get_unfinished_broadcasts():
+            logger.info(f"Возобновление рассылки #{job['broadcast_id']} после user_id {job['cursor']}")
+            self._spawn(bot, job)
+
+    async def stop(self):
+        """Остановка выполняемых рассылок (прогресс уже сохранен в БД)"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _spawn(self, bot: Bot, job: Dict):
+        task = asyncio.create_task(self._run(bot, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, bot: Bot, job: Dict):
+        broadcast_id = job['broadcast_id']
+        semaphore = asyncio.Semaphore(self.concurrency)
+        cursor = job['cursor']
+        sent, failed = job['sent'], job['failed']
+        last_report = time.monotonic()
+
+        try:
+            async for user_ids in self.db.iter_user_id_batches(cursor, self.batch_size):
+                results = await asyncio.gather(
+                    *(self._send(bot, user_id, job['text'], semaphore) for user_id in user_ids)
+                )
+
+                cursor = user_ids[-1]
+                await self.db.save_broadcast_batch(broadcast_id, cursor, results)
+
+                batch_sent = sum(1 for result in results if result[1])
+                sent += batch_sent
+                failed += len(results) - batch_sent
+
+                if time.monotonic() - last_report >= BROADCAST_PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    await self._edit_progress(bot, job, f"""
+📤 Рассылка #{broadcast_id} выполняется...
+
+• Отправлено: {sent}
+• Не удалось отправить: {failed}
+• Обработано: {sent + failed} из {job['total']}
+""")
+
+            await self.db.finish_broadcast(broadcast_id)
+        except Exception:
+            logger.exception(f"Рассылка #{broadcast_id} прервана ошибкой")
+            return
+
+        await self._edit_progress(bot, job, f"📤 Рассылка #{broadcast_id} завершена")
+
+        result_text = f"""
+✅ Рассылка завершена!
+
+📊 Результаты:
+• Успешно отправлено: {sent}
+• Не удалось отправить: {failed}
+    """
+
+        try:
+            await bot.send_message(job['chat_id'], result_text, reply_markup=admin_main_menu())
+        except TelegramAPIError:
+            logger.exception(f"Не удалось отправить итоги рассылки #{broadcast_id}")
+
+    async def _send(self, bot: Bot, user_id: int, text: str, semaphore: asyncio.Semaphore) -> tuple:
+        """Отправка одному пользователю: возвращает (user_id, is_sent, error)"""
+        async with semaphore:
+            sent, error, _ = await send_with_retry(
+                bot, user_id, text, BROADCAST_MAX_ATTEMPTS, BROADCAST_RETRY_DELAY, limiter=self.bucket
+            )
+        return user_id, sent, error
+
+    async def _edit_progress(self, bot: Bot, job: Dict, text: str):
+        """Обновление сообщения о ходе рассылки"""
+        try:
+            await bot.edit_message_text(text, job['chat_id'], job['message_id'])
+        except MessageNotModified:
+            pass
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось обновить прогресс рассылки #{job['broadcast_id']}: {e}")
@@ -0,0 +1,150 @@
+"""
+Компактный формат callback_data для inline-кнопок
+
+Данные кнопки: <версия><код действия><аргументы через ".">. Целые числа
+записываются в base36, значения из фиксированного списка (статусы, фильтры)
+- номером в списке. Например, кнопка "В работу" для заявки #1042 - это
+"1Ssy.1" вместо "admin_status_1042_in_progress" (Telegram ограничивает
+callback_data 64 байтами).
+
+Кнопки с другой версией формата (в том числе старые текстовые) не
+распознаются, и пользователь получает ответ "Кнопка устарела".
+"""
+
+import string
+from typing import Dict, Optional
+
+
+# Версия формата: при несовместимом изменении кодов или аргументов увеличить
+VERSION = "1"
+SEPARATOR = "."
+MAX_LENGTH = 64
+
+_DIGITS = string.digits + string.ascii_lowercase
+
+
+def to_base36(value: int) -> str:
+    if value < 0:
+        raise ValueError(f"Отрицательное значение в callback_data: {value}")
+
+    digits = ""
+    while True:
+        value, rest = divmod(value, 36)
+        digits = _DIGITS[rest] + digits
+        if not value:
+            return digits
+
+
+def from_base36(text: str) -> int:
+    if not text or not text.isalnum() or not text.isascii():
+        raise ValueError(f"Некорректное число в callback_data: {text!r}")
+    return int(text, 36)
+
+
+class Int:
+    """Неотрицательное целое число"""
+
+    def encode(self, value: int) -> str:
+        return to_base36(value)
+
+    def decode(self, text: str) -> int:
+        return from_base36(text)
+
+
+class Choice:
+    """Значение из фиксированного списка (передается номером)"""
+
+    def __init__(self, *values: str):
+        self.values = values
+        self._codes = {value: to_base36(index) for index, value in enumerate(values)}
+
+    def encode(self, value: str) -> str:
+        try:
+            return self._codes[value]
+        except KeyError:
+            raise ValueError(f"Недопустимое значение {value!r}, ожидается одно из {self.values}")
+
+    def decode(self, text: str) -> str:
+        index = from_base36(text)
+        if index >= len(self.values):
+            raise ValueError(f"Недопустимый номер значения: {index}")
+        return self.values[index]
+
+
+INT = Int()
+STATUS = Choice('new', 'in_progress', 'completed', 'cancelled')
+ORDER_FILTER = Choice('all', 'new', 'in_progress', 'completed', 'cancelled')
+DIRECTION = Choice('prev', 'next')
+
+
+class CallbackAction:
+    """Действие inline-кнопки: код и типы аргументов
+
+    Пример:
+        ADMIN_STATUS = CallbackAction('S', order_id=INT, new_status=STATUS)
+        ADMIN_STATUS.new(1042, 'in_progress')  # -> "1Ssy.1"
+        ADMIN_STATUS.parse("sy.1")             # -> {'order_id': 1042, 'new_status': 'in_progress'}
+    """
+
+    _codes = set()
+
+    def __init__(self, code: str, **fields):
+        if len(code) != 1 or code in self._codes:
+            raise ValueError(f"Код действия должен быть одним уникальным символом: {code!r}")
+        self._codes.add(code)
+
+        self.prefix = VERSION + code
+        self.fields = tuple(fields.items())
+
+    def new(self, *values) -> str:
+        """Данные кнопки для значений аргументов"""
+        if len(values) != len(self.fields):
+            raise TypeError(f"Ожидается аргументов: {len(self.fields)}, передано: {len(values)}")
+
+        args = (kind.encode(value) for (name, kind), value in zip(self.fields, values))
+        data = self.prefix + SEPARATOR.join(args)
+
+        if len(data.encode()) > MAX_LENGTH:
+            raise ValueError(f"callback_data длиннее {MAX_LENGTH} байт: {data!r}")
+        return data
+
+    def parse(self, rest: str) -> Optional[Dict]:
+        """Разбор аргументов после префикса (None - данные не подходят)"""
+        if not self.fields:
+            return {} if not rest else None
+
+        parts = rest.split(SEPARATOR)
+        if len(parts) != len(self.fields):
+            return None
+
+        try:
+            return {name: kind.decode(part) for (name, kind), part in zip(self.fields, parts)}
+        except ValueError:
+            return None
+
+
+# Кнопки пользователя
+VIEW_ORDER = CallbackAction('v', order_id=INT)
+WRITE_ORDER_MESSAGE = CallbackAction('m', order_id=INT)
+ORDER_STATUS = CallbackAction('s', order_id=INT)
+REVIEW_ORDER = CallbackAction('r', order_id=INT)
+RATE_ORDER = CallbackAction('t', order_id=INT, rating=INT)
+MY_ORDERS_PAGE = CallbackAction('p', direction=DIRECTION, cursor=INT, status_filter=ORDER_FILTER)
+MY_ORDERS_FILTER = CallbackAction('f', status_filter=ORDER_FILTER)
+REVIEW_ORDERS_PAGE = CallbackAction('w', direction=DIRECTION, cursor=INT)
+
+# Кнопки администратора
+ADMIN_ORDER = CallbackAction('O', order_id=INT)
+ADMIN_STATUS = CallbackAction('S', order_id=INT, new_status=STATUS)
+ADMIN_MESSAGE = CallbackAction('M', order_id=INT)
+ADMIN_COMMENT = CallbackAction('C', order_id=INT)
+ADMIN_BACK_TO_ORDERS = CallbackAction('B')
+ORDER_HISTORY = CallbackAction('H', order_id=INT, before_message_id=INT)
+ORDERS_PAGE = CallbackAction('P', direction=DIRECTION, cursor=INT, status_filter=ORDER_FILTER)
+ORDERS_FILTER = CallbackAction('F', status_filter=ORDER_FILTER)
+BROADCAST_CONFIRM = CallbackAction('Y')
+BROADCAST_CANCEL = CallbackAction('N')
+SEARCH_PAGE = CallbackAction('Q', offset=INT)
+USER_CARD = CallbackAction('U', user_id=INT)
+USER_ORDERS = CallbackAction('L', user_id=INT)
+USER_ORDERS_PAGE = CallbackAction('G', direction=DIRECTION, cursor=INT, user_id=INT)
@@ -0,0 +1,115 @@
+"""
+Маршрутизация callback-запросов
+
+Обработчики хранятся в префиксном дереве (trie) по началу callback_data
+(версия формата + код действия, см. callback_data.py), поэтому поиск
+занимает O(длины данных) независимо от числа обработчиков.
+Правила выбора:
+• побеждает самый длинный зарегистрированный префикс;
+• если остаток данных не подходит под аргументы действия
+  (не то количество или не тот тип), пробуется следующий по длине префикс;
+• действие без аргументов срабатывает только на точное совпадение.
+
+Нераспознанные данные (кнопки другой версии формата) получают ответ
+"Кнопка устарела".
+"""
+
+import inspect
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+from aiogram import types, Dispatcher
+
+from callback_data import CallbackAction
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Route:
+    """Обработчик и действие, аргументы которого он получает"""
+
+    __slots__ = ('handler', 'action', 'accepts')
+
+    def __init__(self, handler: Callable, action: CallbackAction):
+        self.handler = handler
+        self.action = action
+
+        # Имена аргументов, которые обработчик готов принять из данных aiogram
+        params = inspect.signature(handler).parameters.values()
+        if any(param.kind is param.VAR_KEYWORD for param in params):
+            self.accepts = None
+        else:
+            self.accepts = frozenset(param.name for param in params)
+
+
+class _Node:
+    __slots__ = ('children', 'route')
+
+    def __init__(self):
+        self.children = {}
+        self.route: Optional[_Route] = None
+
+
+class CallbackRouter:
+    """Единый обработчик callback-запросов с разбором аргументов
+
+    Пример:
+        router.register(ADMIN_STATUS, admin_change_status)
+
+    Обработчик вызывается как admin_change_status(callback, order_id=..., new_status=...)
+    и дополнительно получает объекты из данных aiogram (state, db и т.п.),
+    если объявит аргументы с такими именами.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+
+    def register(self, action: CallbackAction, handler: Callable):
+        """Регистрация обработчика для действия"""
+        node = self._root
+        for char in action.prefix:
+            node = node.children.setdefault(char, _Node())
+
+        if node.route is not None:
+            raise ValueError(f"Префикс {action.prefix!r} уже занят обработчиком {node.route.handler.__name__}")
+
+        node.route = _Route(handler, action)
+
+    def resolve(self, data: str) -> Tuple[Optional[_Route], Optional[Dict]]:
+        """Поиск обработчика и разбор аргументов"""
+        node = self._root
+        matches = []
+
+        for length, char in enumerate(data, 1):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.route is not None:
+                matches.append((length, node.route))
+
+        # Сначала самый длинный префикс
+        for length, route in reversed(matches):
+            args = route.action.parse(data[length:])
+            if args is not None:
+                return route, args
+
+        return None, None
+
+    async def dispatch(self, callback: types.CallbackQuery, **data):
+        route, args = self.resolve(callback.data or "")
+
+        if route is None:
+            # Кнопка из старого сообщения или другой версии формата
+            logger.info(f"Нераспознанная callback_data {callback.data!r}")
+            await callback.answer("⚠️ Кнопка устарела. Откройте меню заново.", show_alert=True)
+            return
+
+        if route.accepts is not None:
+            data = {key: value for key, value in data.items() if key in route.accepts}
+
+        return await route.handler(callback, **data, **args)
+
+    def setup(self, dp: Dispatcher):
+        """Регистрация роутера в диспетчере (в любом состоянии FSM)"""
+        dp.register_callback_query_handler(self.dispatch, state='*')
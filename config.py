@@ -2,9 +2,59 @@
 BOT_TOKEN = "8530495432:AAGb-1kRXD6GeEBYHYIgcN8G3DER1vn1LjE"
 ADMIN_ID = 6673790674
 
+# Режим получения обновлений: webhook (True) или long polling (False)
+USE_WEBHOOK = False
+WEBHOOK_HOST = ""  # Публичный адрес бота, например https://bot.example.com (пусто - webhook не регистрируется)
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = ""  # Секрет для заголовка X-Telegram-Bot-Api-Secret-Token (символы A-Z, a-z, 0-9, _ и -)
+WEBAPP_HOST = "0.0.0.0"  # Адрес, на котором слушает веб-сервер
+WEBAPP_PORT = 8080
+HEALTH_PATH = "/health"
+
 # Настройки базы данных
 DB_NAME = "bot_database.db"
 
+# Пул подключений к SQLite
+DB_READ_CONNECTIONS = 4  # Количество подключений на чтение
+DB_CACHE_SIZE_KB = 16384  # Размер кэша страниц на подключение (КБ)
+DB_MMAP_SIZE = 64 * 1024 * 1024  # Размер memory-mapped I/O (байт)
+
+# Групповая запись вставок (сообщения, заявки, отзывы, пользователи)
+DB_WRITE_BATCH_DELAY = 0.003  # Ожидание следующих вставок перед записью (секунды)
+DB_WRITE_BATCH_SIZE = 500  # Максимум вставок в одной транзакции
+
+# Поиск по заявкам и переписке (админ-панель)
+SEARCH_RANK_LIMIT = 2000  # Больше совпадений в индексе - без bm25, по новизне
+SEARCH_MAX_RESULTS = 500  # Максимум заявок в результатах одного поиска
+
+# Кэш заявок в памяти
+ORDER_CACHE_SIZE = 1024  # Максимум заявок в кэше
+ORDER_CACHE_TTL = 60  # Время жизни записи (секунд)
+
+# Настройки рассылки
+BROADCAST_RATE = 30  # Сообщений в секунду (лимит Telegram)
+BROADCAST_CONCURRENCY = 25  # Одновременных запросов к Telegram
+BROADCAST_BATCH_SIZE = 200  # Пользователей в одной порции (сохраняется в БД целиком)
+BROADCAST_MAX_ATTEMPTS = 3  # Попыток отправки одному пользователю
+BROADCAST_RETRY_DELAY = 1  # Задержка перед повтором после сетевой ошибки (секунды, удваивается)
+BROADCAST_PROGRESS_INTERVAL = 5  # Интервал обновления прогресса (секунды)
+
+# Очередь уведомлений
+NOTIFY_WORKERS = 4  # Параллельных отправителей (сообщения одному чату идут по порядку)
+NOTIFY_MAX_ATTEMPTS = 5  # Попыток доставки до записи в failed_notifications
+NOTIFY_RETRY_DELAY = 1  # Базовая задержка перед повтором (секунды, удваивается)
+
+# Хранилище состояний FSM
+FSM_STATE_TTL = 24 * 60 * 60  # Незаконченный диалог удаляется после простоя (секунды)
+FSM_CACHE_SIZE = 10000  # Максимум состояний в памяти
+FSM_EMPTY_CACHE_SIZE = 100000  # Максимум запомненных пользователей без состояния
+FSM_FLUSH_INTERVAL = 1  # Интервал записи изменений в БД (секунды)
+FSM_CLEANUP_INTERVAL = 10 * 60  # Интервал удаления устаревших состояний (секунды)
+
+# Кэш зарегистрированных пользователей
+USER_CACHE_SIZE = 50000  # Максимум пользователей в памяти
+USER_FLUSH_INTERVAL = 30  # Интервал записи изменений имени/username в БД (секунды)
+
 # Текстовые сообщения
 WELCOME_MESSAGE = """
 👋 Добро пожаловать в сервис создания Telegram ботов!
@@ -1,373 +1,1236 @@
+import asyncio
+import queue
 import sqlite3
-import datetime
-from typing import List, Dict, Optional
+import functools
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
+from config import (DB_READ_CONNECTIONS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, ORDER_CACHE_SIZE, ORDER_CACHE_TTL,
+                    DB_WRITE_BATCH_DELAY, DB_WRITE_BATCH_SIZE, SEARCH_RANK_LIMIT, SEARCH_MAX_RESULTS)
+from migrations import MIGRATIONS, SCHEMA_VERSION
+from models import User, UserSummary, Order, Message, OrderHit, SNIPPET_START, SNIPPET_END
 
-class Database:
-    def __init__(self, db_name: str):
-        self.db_name = db_name
-        self.init_db()
 
-    def get_connection(self):
-        """Создание подключения к БД"""
-        return sqlite3.connect(self.db_name)
+logger = logging.getLogger(__name__)
 
-    def init_db(self):
-        """Инициализация базы данных"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        # Таблица пользователей
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                registration_date TEXT,
-                is_blocked INTEGER DEFAULT 0
-            )
-        """)
-
-        # Таблица заявок
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS orders (
-                order_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                description TEXT,
-                status TEXT DEFAULT 'new',
-                created_at TEXT,
-                updated_at TEXT,
-                admin_comment TEXT,
-                budget TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-
-        # Таблица сообщений (переписка по заявке)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                message_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                order_id INTEGER,
-                user_id INTEGER,
-                message_text TEXT,
-                is_from_admin INTEGER DEFAULT 0,
-                created_at TEXT,
-                FOREIGN KEY (order_id) REFERENCES orders (order_id),
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-
-        # Таблица отзывов
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS reviews (
-                review_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                order_id INTEGER,
-                rating INTEGER,
-                comment TEXT,
-                created_at TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                FOREIGN KEY (order_id) REFERENCES orders (order_id)
-            )
-        """)
+# Колонки таблицы statistics со счетчиками заявок по статусам
+ORDER_COUNTERS = {
+    'new': 'new_orders',
+    'in_progress': 'in_progress',
+    'completed': 'completed',
+    'cancelled': 'cancelled'
+}
 
-        conn.commit()
-        conn.close()
 
-    def add_user(self, user_id: int, username: str, first_name: str, last_name: str):
-        """Добавление нового пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+# Слов поискового запроса, передаваемых в FTS5
+SEARCH_MAX_WORDS = 10
 
-        registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        cursor.execute("""
-            INSERT OR IGNORE INTO users (user_id, username, first_name, last_name, registration_date)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user_id, username, first_name, last_name, registration_date))
+# Слов фрагмента текста в результатах поиска
+SNIPPET_WORDS = 12
 
-        conn.commit()
-        conn.close()
 
-    def get_user(self, user_id: int) -> Optional[Dict]:
-        """Получение информации о пользователе"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+def search_words(text: str) -> List[str]:
+    """Слова поискового запроса (в нижнем регистре)"""
+    return re.findall(r"\w+", text.lower())[:SEARCH_MAX_WORDS]
+
+
+def make_snippet(text: str, words: List[str]) -> str:
+    """Фрагмент текста вокруг первого найденного слова ("" - слов в тексте нет)
+
+    Найденные слова отмечаются SNIPPET_START/SNIPPET_END, последнее слово
+    запроса ищется по началу слова (как в fts_query).
+    """
+    tokens = list(re.finditer(r"\w+", text or ""))
+    if not tokens or not words:
+        return ""
+
+    exact, prefix = set(words[:-1]), words[-1]
 
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        user = cursor.fetchone()
+    def found(token) -> bool:
+        word = token.group().lower()
+        return word in exact or word.startswith(prefix)
 
-        conn.close()
+    first = next((index for index, token in enumerate(tokens) if found(token)), None)
+    if first is None:
+        return ""
 
-        if user:
+    start = max(0, min(first - SNIPPET_WORDS // 4, len(tokens) - SNIPPET_WORDS))
+    window = tokens[start:start + SNIPPET_WORDS]
+
+    parts = ["…"] if start > 0 else []
+    position = window[0].start()
+    for token in window:
+        parts.append(text[position:token.start()])
+        if found(token):
+            parts.append(SNIPPET_START + token.group() + SNIPPET_END)
+        else:
+            parts.append(token.group())
+        position = token.end()
+    if start + SNIPPET_WORDS < len(tokens):
+        parts.append("…")
+
+    return "".join(parts)
+
+
+def fts_query(text: str) -> str:
+    """Запрос FTS5 из текста администратора: все слова, последнее - по началу слова
+
+    Кавычки и операторы FTS5 из текста отбрасываются, поэтому запрос
+    всегда синтаксически корректен. Пустая строка - искать нечего.
+    """
+    words = [f'"{word}"' for word in search_words(text)]
+    if words:
+        # Поиск по началу только для последнего слова: префикс с многими
+        # вариантами слова заметно дороже точного совпадения
+        words[-1] += "*"
+    return " ".join(words)
+
+
+def casefold(text: Optional[str]) -> Optional[str]:
+    """Значение для поиска без учета регистра (в том числе кириллицы)"""
+    return text.casefold() if text is not None else None
+
+
+def register_functions(conn: sqlite3.Connection):
+    """Функции Python, доступные в SQL (используются в миграциях)"""
+    conn.create_function("casefold", 1, casefold, deterministic=True)
+
+
+class ConnectionPool:
+    """Пул долгоживущих подключений: одно на запись и несколько на чтение
+
+    БД в памяти (":memory:", например, для тестов) обслуживается одним
+    подключением: чтение идет через подключение на запись под той же
+    блокировкой. Общий кэш в памяти (cache=shared) для пула не подходит:
+    блокировки таблиц в нем не ждут busy_timeout, и читатели получают
+    "database table is locked", пока открыта транзакция записи.
+    """
+
+    def __init__(self, db_name: str, read_connections: int, cache_size_kb: int, mmap_size: int):
+        self.db_name = db_name
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.in_memory = db_name == ":memory:"
+
+        # Подключение на запись создается первым, чтобы включить WAL до открытия читателей
+        self._writer = self._connect()
+        # Чтение в памяти может выполняться внутри записи в том же потоке
+        self._write_lock = threading.RLock()
+
+        self._readers = queue.Queue()
+        if self.in_memory:
+            return
+
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        for _ in range(read_connections):
+            self._readers.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        """Создание подключения с настроенными PRAGMA"""
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        register_functions(conn)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """Монопольный доступ к подключению на запись"""
+        with self._write_lock:
+            yield self._writer
+
+    @contextmanager
+    def reader(self):
+        """Подключение на чтение из пула"""
+        if self.in_memory:
+            with self._write_lock:
+                yield self._writer
+            return
+
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        """Закрытие всех подключений пула"""
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+
+class OrderCache:
+    """Ограниченный LRU-кэш заявок со временем жизни записей
+
+    Методы Database вызываются из нескольких потоков, поэтому доступ к кэшу
+    идет под блокировкой. Чтобы запрос, начатый до изменения заявки, не
+    положил в кэш устаревшие данные, запись принимается только если с
+    момента generation() не было инвалидаций.
+    """
+
+    def __init__(self, maxsize: int = ORDER_CACHE_SIZE, ttl: float = ORDER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        # order_id -> (время истечения, заявка или None)
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, order_id: int) -> Tuple[bool, Optional[Order]]:
+        """Поиск заявки: (найдена ли в кэше, заявка)"""
+        with self._lock:
+            entry = self._entries.get(order_id)
+
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(order_id)
+            self.hits += 1
+
+        # Записи неизменяемы, поэтому отдаются без копирования
+        return True, entry[1]
+
+    def put(self, order_id: int, order: Optional[Order], generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            self._entries[order_id] = (time.monotonic() + self.ttl, order)
+            self._entries.move_to_end(order_id)
+
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, order_id: int):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(order_id, None)
+
+    def invalidate_user(self, user_id: int):
+        """Сброс заявок пользователя (в записях хранятся его имя и username)"""
+        with self._lock:
+            self._generation += 1
+            for order_id, (expires, order) in list(self._entries.items()):
+                if order is not None and order.user_id == user_id:
+                    del self._entries[order_id]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            requests = self.hits + self.misses
             return {
-                'user_id': user[0],
-                'username': user[1],
-                'first_name': user[2],
-                'last_name': user[3],
-                'registration_date': user[4],
-                'is_blocked': user[5]
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests * 100, 1) if requests else 0
             }
-        return None
 
-    def create_order(self, user_id: int, description: str, budget: str = "") -> int:
-        """Создание новой заявки"""
+
+class Database:
+    def __init__(self, db_name: str, pooled: bool = True,
+                 read_connections: int = DB_READ_CONNECTIONS,
+                 cache_size_kb: int = DB_CACHE_SIZE_KB,
+                 mmap_size: int = DB_MMAP_SIZE):
+        self.db_name = db_name
+        self.order_cache = OrderCache()
+        self.pool = None
+        if pooled:
+            self.pool = ConnectionPool(db_name, read_connections, cache_size_kb, mmap_size)
+        self.init_db()
+
+    def get_connection(self):
+        """Создание подключения к БД"""
+        conn = sqlite3.connect(self.db_name)
+        register_functions(conn)
+        return conn
+
+    @contextmanager
+    def _reader(self):
+        """Подключение для чтения: из пула или новое на один вызов"""
+        if self.pool is not None:
+            with self.pool.reader() as conn:
+                yield conn
+            return
+
         conn = self.get_connection()
-        cursor = conn.cursor()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _writer(self):
+        """Подключение для записи с фиксацией транзакции при успехе"""
+        if self.pool is not None:
+            with self.pool.writer() as conn:
+                try:
+                    yield conn
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            return
 
-        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.get_connection()
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
 
-        cursor.execute("""
-            INSERT INTO orders (user_id, description, status, created_at, updated_at, budget)
-            VALUES (?, ?, 'new', ?, ?, ?)
-        """, (user_id, description, created_at, created_at, budget))
+    def close(self):
+        """Закрытие пула подключений"""
+        if self.pool is not None:
+            self.pool.close()
 
-        order_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+    def init_db(self):
+        """Инициализация базы данных и применение недостающих миграций"""
+        with self._writer() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+            # Схема актуальна - DDL не выполняется
+            if version >= SCHEMA_VERSION:
+                return
+
+            for number in range(version + 1, SCHEMA_VERSION + 1):
+                # Каждая миграция применяется в своей транзакции вместе с номером версии
+                conn.executescript(
+                    "BEGIN;\n"
+                    f"{MIGRATIONS[number - 1]}\n"
+                    f"PRAGMA user_version = {number};\n"
+                    "COMMIT;"
+                )
+
+    def _add_user_insert(self, user_id: int, username: str, first_name: str, last_name: str) -> Tuple[str, tuple]:
+        registration_date = int(time.time())
+        return """
+            INSERT OR IGNORE INTO users (user_id, username, first_name, last_name, registration_date,
+                                         username_search, first_name_search)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (user_id, username, first_name, last_name, registration_date, casefold(username), casefold(first_name))
 
-        return order_id
+    def add_user(self, user_id: int, username: str, first_name: str, last_name: str):
+        """Добавление нового пользователя"""
+        self.write_batch([('add_user', (user_id, username, first_name, last_name))])
+
+    def update_user_profiles(self, profiles: List[tuple]):
+        """Запись изменившихся профилей: (user_id, username, first_name, last_name)"""
+        if not profiles:
+            return
+
+        with self._writer() as conn:
+            conn.executemany("""
+                UPDATE users SET username = ?, first_name = ?, last_name = ?,
+                                 username_search = ?, first_name_search = ?
+                WHERE user_id = ?
+            """, [
+                (username, first_name, last_name, casefold(username), casefold(first_name), user_id)
+                for user_id, username, first_name, last_name in profiles
+            ])
+
+        for profile in profiles:
+            self.order_cache.invalidate_user(profile[0])
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Получение информации о пользователе"""
+        with self._reader() as conn:
+            row = conn.execute(f"SELECT {User.COLUMNS} FROM users u WHERE u.user_id = ?", (user_id,)).fetchone()
 
-    def get_user_orders(self, user_id: int) -> List[Dict]:
-        """Получение всех заявок пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        return User._make(row) if row else None
 
-        cursor.execute("""
-            SELECT order_id, description, status, created_at, updated_at, admin_comment, budget
-            FROM orders
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        """, (user_id,))
+    def _create_order_insert(self, user_id: int, description: str, budget: str = "") -> Tuple[str, tuple]:
+        created_at = int(time.time())
+        return """
+            INSERT INTO orders (user_id, description, status, created_at, updated_at, budget)
+            VALUES (?, ?, 'new', ?, ?, ?)
+        """, (user_id, description, created_at, created_at, budget)
 
-        orders = cursor.fetchall()
-        conn.close()
+    def create_order(self, user_id: int, description: str, budget: str = "") -> int:
+        """Создание новой заявки"""
+        return self.write_batch([('create_order', (user_id, description, budget))])[0]
 
-        result = []
-        for order in orders:
-            result.append({
-                'order_id': order[0],
-                'description': order[1],
-                'status': order[2],
-                'created_at': order[3],
-                'updated_at': order[4],
-                'admin_comment': order[5],
-                'budget': order[6]
-            })
+    def _create_order_with_message_insert(self, user_id: int, description: str,
+                                          budget: str = "") -> Tuple[str, tuple]:
+        return self._create_order_insert(user_id, description, budget)
 
-        return result
+    def create_order_with_message(self, user_id: int, description: str, budget: str = "") -> int:
+        """Создание заявки вместе с первым сообщением переписки (текстом заявки)"""
+        return self.write_batch([('create_order_with_message', (user_id, description, budget))])[0]
 
-    def get_order(self, order_id: int) -> Optional[Dict]:
-        """Получение информации о заявке"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_user_orders(self, user_id: int, status: str = None, limit: int = None) -> List[Order]:
+        """Получение заявок пользователя (новые первыми), при необходимости по статусу"""
+        conditions = ["o.user_id = ?"]
+        params = [user_id]
+
+        if status:
+            conditions.append("o.status = ?")
+            params.append(status)
 
-        cursor.execute("""
-            SELECT o.order_id, o.user_id, o.description, o.status, o.created_at,
-                   o.updated_at, o.admin_comment, o.budget,
-                   u.username, u.first_name, u.last_name
+        query = f"""
+            SELECT {Order.COLUMNS}
             FROM orders o
             JOIN users u ON o.user_id = u.user_id
-            WHERE o.order_id = ?
-        """, (order_id,))
+            WHERE {' AND '.join(conditions)}
+            ORDER BY o.created_at DESC
+        """
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._reader() as conn:
+            return list(map(Order._make, conn.execute(query, params)))
+
+    def get_user_summary(self, user_id: int) -> Optional[UserSummary]:
+        """Пользователь и счетчики его заявок (из таблицы user_order_stats)"""
+        with self._reader() as conn:
+            row = conn.execute(f"""
+                SELECT {UserSummary.COLUMNS}
+                FROM users u
+                LEFT JOIN user_order_stats s ON s.user_id = u.user_id
+                WHERE u.user_id = ?
+            """, (user_id,)).fetchone()
+
+        return UserSummary._make(row) if row else None
+
+    def search_users(self, text: str, limit: int = 10) -> List[UserSummary]:
+        """Поиск пользователей: по user_id или по началу username и имени
+
+        Сравнение без учета регистра идет по индексам username_search и
+        first_name_search (диапазон [префикс, префикс + U+10FFFF)).
+        Первыми идут клиенты с самыми свежими заявками.
+        """
+        text = text.strip().lstrip("@")
+        if not text:
+            return []
+
+        if text.isdigit():
+            summary = self.get_user_summary(int(text))
+            if summary:
+                return [summary]
+
+        prefix = casefold(text)
+        bounds = (prefix, prefix + "\U0010ffff")
+
+        with self._reader() as conn:
+            return list(map(UserSummary._make, conn.execute(f"""
+                SELECT {UserSummary.COLUMNS}
+                FROM users u
+                LEFT JOIN user_order_stats s ON s.user_id = u.user_id
+                WHERE u.user_id IN (
+                    SELECT user_id FROM users WHERE username_search >= ? AND username_search < ?
+                    UNION
+                    SELECT user_id FROM users WHERE first_name_search >= ? AND first_name_search < ?
+                )
+                ORDER BY COALESCE(s.last_order_at, 0) DESC, u.user_id
+                LIMIT ?
+            """, (*bounds, *bounds, limit))))
+
+    def get_order(self, order_id: int) -> Optional[Order]:
+        """Получение информации о заявке (через кэш)"""
+        found, order = self.order_cache.get(order_id)
+        if found:
+            return order
+
+        generation = self.order_cache.generation()
+        order = self._select_order(order_id)
+        self.order_cache.put(order_id, order, generation)
+
+        return order
+
+    def _select_order(self, order_id: int) -> Optional[Order]:
+        with self._reader() as conn:
+            row = conn.execute(f"""
+                SELECT {Order.COLUMNS}
+                FROM orders o
+                JOIN users u ON o.user_id = u.user_id
+                WHERE o.order_id = ?
+            """, (order_id,)).fetchone()
 
-        order = cursor.fetchone()
-        conn.close()
-
-        if order:
-            return {
-                'order_id': order[0],
-                'user_id': order[1],
-                'description': order[2],
-                'status': order[3],
-                'created_at': order[4],
-                'updated_at': order[5],
-                'admin_comment': order[6],
-                'budget': order[7],
-                'username': order[8],
-                'first_name': order[9],
-                'last_name': order[10]
-            }
-        return None
+        return Order._make(row) if row else None
 
     def update_order_status(self, order_id: int, status: str, admin_comment: str = ""):
         """Обновление статуса заявки"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        updated_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        updated_at = int(time.time())
 
-        cursor.execute("""
-            UPDATE orders
-            SET status = ?, admin_comment = ?, updated_at = ?
-            WHERE order_id = ?
-        """, (status, admin_comment, updated_at, order_id))
+        with self._writer() as conn:
+            conn.execute("""
+                UPDATE orders
+                SET status = ?, admin_comment = ?, updated_at = ?
+                WHERE order_id = ?
+            """, (status, admin_comment, updated_at, order_id))
 
-        conn.commit()
-        conn.close()
+        self.order_cache.invalidate(order_id)
 
-    def get_all_orders(self, status: str = None) -> List[Dict]:
+    def get_all_orders(self, status: str = None) -> List[Order]:
         """Получение всех заявок (для админа)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        where = "WHERE o.status = ?" if status else ""
+        params = (status,) if status else ()
 
-        if status:
-            cursor.execute("""
-                SELECT o.order_id, o.user_id, o.description, o.status, o.created_at,
-                       o.updated_at, o.budget,
-                       u.username, u.first_name
+        with self._reader() as conn:
+            return list(map(Order._make, conn.execute(f"""
+                SELECT {Order.COLUMNS}
                 FROM orders o
                 JOIN users u ON o.user_id = u.user_id
-                WHERE o.status = ?
+                {where}
                 ORDER BY o.created_at DESC
-            """, (status,))
-        else:
-            cursor.execute("""
-                SELECT o.order_id, o.user_id, o.description, o.status, o.created_at,
-                       o.updated_at, o.budget,
-                       u.username, u.first_name
+            """, params)))
+
+    def get_orders_page(self, status: str = None, cursor: int = None,
+                        backward: bool = False, limit: int = 5, user_id: int = None) -> Dict:
+        """Страница заявок с курсором по (created_at, order_id)
+
+        cursor - order_id граничной заявки предыдущей страницы. По умолчанию
+        возвращаются заявки старше курсора, при backward=True - новее него.
+        user_id - только заявки одного пользователя (раздел "Мои заявки").
+        """
+        conditions = []
+        params = []
+
+        if user_id is not None:
+            conditions.append("o.user_id = ?")
+            params.append(user_id)
+
+        if status:
+            conditions.append("o.status = ?")
+            params.append(status)
+
+        if cursor is not None:
+            sign = ">" if backward else "<"
+            conditions.append(f"""
+                (o.created_at, o.order_id) {sign}
+                (SELECT created_at, order_id FROM orders WHERE order_id = ?)
+            """)
+            params.append(cursor)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "ASC" if backward else "DESC"
+
+        # Лишняя строка показывает, есть ли заявки за пределами страницы
+        params.append(limit + 1)
+
+        with self._reader() as conn:
+            orders = conn.execute(f"""
+                SELECT {Order.COLUMNS}
                 FROM orders o
                 JOIN users u ON o.user_id = u.user_id
-                ORDER BY o.created_at DESC
-            """)
+                {where}
+                ORDER BY o.created_at {order}, o.order_id {order}
+                LIMIT ?
+            """, params).fetchall()
 
-        orders = cursor.fetchall()
-        conn.close()
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        if backward:
+            orders.reverse()
 
-        result = []
-        for order in orders:
-            result.append({
-                'order_id': order[0],
-                'user_id': order[1],
-                'description': order[2],
-                'status': order[3],
-                'created_at': order[4],
-                'updated_at': order[5],
-                'budget': order[6],
-                'username': order[7],
-                'first_name': order[8]
-            })
+        return {
+            'orders': list(map(Order._make, orders)),
+            'has_prev': has_more if backward else cursor is not None,
+            'has_next': cursor is not None if backward else has_more
+        }
 
-        return result
+    def count_orders(self, status: str = None) -> int:
+        """Количество заявок (всех или с указанным статусом) из таблицы счетчиков"""
+        column = ORDER_COUNTERS[status] if status else "total_orders"
+
+        with self._reader() as conn:
+            return conn.execute(f"SELECT {column} FROM statistics WHERE id = 1").fetchone()[0]
+
+    def _add_message_insert(self, order_id: int, user_id: int, message_text: str,
+                            is_from_admin: bool = False) -> Tuple[str, tuple]:
+        created_at = int(time.time())
+        return """
+            INSERT INTO messages (order_id, user_id, message_text, is_from_admin, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (order_id, user_id, message_text, 1 if is_from_admin else 0, created_at)
 
     def add_message(self, order_id: int, user_id: int, message_text: str, is_from_admin: bool = False):
         """Добавление сообщения в переписку"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        self.write_batch([('add_message', (order_id, user_id, message_text, is_from_admin))])
+
+    def get_order_messages(self, order_id: int, limit: int = None,
+                           before_message_id: int = None) -> List[Message]:
+        """Получение сообщений по заявке в порядке отправки
+
+        limit - только последние N сообщений, before_message_id - сообщения
+        старше указанного (курсор для листания истории назад).
+        """
+        conditions = ["m.order_id = ?"]
+        params = [order_id]
+
+        if before_message_id is not None:
+            conditions.append("m.message_id < ?")
+            params.append(before_message_id)
+
+        # Хвост истории читается по индексу (order_id, message_id) с конца
+        query = f"""
+            SELECT {Message.COLUMNS}
+            FROM messages m
+            WHERE {' AND '.join(conditions)}
+            ORDER BY m.message_id DESC
+        """
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._reader() as conn:
+            messages = conn.execute(query, params).fetchall()
+
+        return list(map(Message._make, reversed(messages)))
+
+    def get_messages_page(self, order_id: int, before_message_id: int = None, limit: int = 5) -> Dict:
+        """Страница истории сообщений: последние limit сообщений до курсора"""
+        messages = self.get_order_messages(order_id, limit + 1, before_message_id)
+
+        has_older = len(messages) > limit
+        if has_older:
+            messages = messages[1:]
+
+        return {
+            'messages': messages,
+            'has_older': has_older
+        }
 
-        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def search_orders(self, text: str) -> Dict:
+        """Поиск заявок по описанию, комментарию и переписке
+
+        Возвращает найденные заявки (не больше SEARCH_MAX_RESULTS) в порядке
+        показа: пары (order_id, message_id лучшего совпадения или None, если
+        совпало описание или комментарий). Страницы строятся по ним через
+        get_order_hits без повторного поиска.
+
+        Если совпадений в каждом индексе не больше SEARCH_RANK_LIMIT, заявки
+        упорядочены по релевантности (bm25) лучшего совпадения. Для слишком
+        частых слов bm25 пришлось бы считать для каждого совпадения, поэтому
+        берутся заявки самых новых SEARCH_RANK_LIMIT совпадений, новые
+        первыми (ranked=False).
+        """
+        query = fts_query(text)
+        if not query:
+            return {'matches': [], 'ranked': True, 'truncated': False}
+
+        with self._reader() as conn:
+            # Подсчет останавливается на SEARCH_RANK_LIMIT + 1 совпадении
+            frequent = any(
+                conn.execute(f"""
+                    SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE {table} MATCH ? LIMIT ?)
+                """, (query, SEARCH_RANK_LIMIT + 1)).fetchone()[0] > SEARCH_RANK_LIMIT
+                for table in ("orders_fts", "messages_fts")
+            )
 
-        cursor.execute("""
-            INSERT INTO messages (order_id, user_id, message_text, is_from_admin, created_at)
+            if frequent:
+                rows = conn.execute("""
+                    WITH matches AS (
+                        SELECT * FROM (
+                            SELECT rowid AS order_id, NULL AS message_id
+                            FROM orders_fts
+                            WHERE orders_fts MATCH ?
+                            ORDER BY rowid DESC
+                            LIMIT ?
+                        )
+                        UNION ALL
+                        SELECT m.order_id, f.message_id
+                        FROM (
+                            SELECT rowid AS message_id
+                            FROM messages_fts
+                            WHERE messages_fts MATCH ?
+                            ORDER BY rowid DESC
+                            LIMIT ?
+                        ) f
+                        JOIN messages m ON m.message_id = f.message_id
+                    )
+                    -- Совпадение в описании важнее, иначе - самое новое сообщение
+                    SELECT order_id, CASE WHEN COUNT(message_id) < COUNT(*) THEN NULL ELSE MAX(message_id) END
+                    FROM matches
+                    GROUP BY order_id
+                    ORDER BY order_id DESC
+                    LIMIT ?
+                """, (query, SEARCH_RANK_LIMIT, query, SEARCH_RANK_LIMIT, SEARCH_MAX_RESULTS + 1)).fetchall()
+            else:
+                rows = conn.execute("""
+                    WITH matches AS (
+                        SELECT rowid AS order_id, NULL AS message_id, rank
+                        FROM orders_fts
+                        WHERE orders_fts MATCH ?
+                        UNION ALL
+                        SELECT m.order_id, f.rowid, f.rank
+                        FROM messages_fts f
+                        JOIN messages m ON m.message_id = f.rowid
+                        WHERE messages_fts MATCH ?
+                    )
+                    -- message_id берется из строки с лучшим совпадением
+                    SELECT order_id, message_id, MIN(rank) AS best
+                    FROM matches
+                    GROUP BY order_id
+                    ORDER BY best, order_id DESC
+                    LIMIT ?
+                """, (query, query, SEARCH_MAX_RESULTS + 1)).fetchall()
+
+        return {
+            'matches': [(row[0], row[1]) for row in rows[:SEARCH_MAX_RESULTS]],
+            'ranked': not frequent,
+            'truncated': frequent or len(rows) > SEARCH_MAX_RESULTS
+        }
+
+    def get_order_hits(self, text: str, matches: List[Tuple[int, Optional[int]]]) -> List[OrderHit]:
+        """Заявки страницы результатов поиска с фрагментами текста
+
+        matches - пары (order_id, message_id) из search_orders. Фрагмент
+        строится по тексту совпадения без обращения к индексу FTS5.
+        """
+        words = search_words(text)
+        if not words or not matches:
+            return []
+
+        order_ids = [order_id for order_id, message_id in matches]
+        message_ids = [message_id for order_id, message_id in matches if message_id is not None]
+
+        with self._reader() as conn:
+            rows = {row[0]: row for row in conn.execute(f"""
+                SELECT {OrderHit.COLUMNS}, o.description, o.admin_comment
+                FROM orders o
+                JOIN users u ON u.user_id = o.user_id
+                WHERE o.order_id IN ({", ".join("?" * len(order_ids))})
+            """, order_ids)}
+
+            messages = dict(conn.execute(f"""
+                SELECT message_id, message_text FROM messages
+                WHERE message_id IN ({", ".join("?" * len(message_ids))})
+            """, message_ids)) if message_ids else {}
+
+        hits = []
+        for order_id, message_id in matches:
+            row = rows.get(order_id)
+            if row is None:
+                continue
+
+            if message_id is not None:
+                snippet = make_snippet(messages.get(message_id), words)
+            else:
+                description, admin_comment = row[-2:]
+                snippet = make_snippet(description, words) or make_snippet(admin_comment, words)
+            hits.append(OrderHit._make((*row[:-2], snippet)))
+
+        return hits
+
+    def _add_review_insert(self, user_id: int, order_id: int, rating: int, comment: str) -> Tuple[str, tuple]:
+        created_at = int(time.time())
+        return """
+            INSERT INTO reviews (user_id, order_id, rating, comment, created_at)
             VALUES (?, ?, ?, ?, ?)
-        """, (order_id, user_id, message_text, 1 if is_from_admin else 0, created_at))
+        """, (user_id, order_id, rating, comment, created_at)
 
-        conn.commit()
-        conn.close()
+    def add_review(self, user_id: int, order_id: int, rating: int, comment: str):
+        """Добавление отзыва"""
+        self.write_batch([('add_review', (user_id, order_id, rating, comment))])
+
+    # Вставки, которые можно выполнять через write_batch: имя -> построитель запроса
+    WRITE_OPERATIONS = {
+        'add_user': _add_user_insert,
+        'create_order': _create_order_insert,
+        'create_order_with_message': _create_order_with_message_insert,
+        'add_message': _add_message_insert,
+        'add_review': _add_review_insert,
+    }
+
+    def write_batch(self, operations: List[tuple]) -> List[Optional[int]]:
+        """Выполнение пачки вставок одной транзакцией (group commit)
+
+        operations - список (метод, аргументы), метод - ключ WRITE_OPERATIONS.
+        Подряд идущие вставки одного вида выполняются одним executemany.
+        Возвращает для каждой вставки номер новой заявки для create_order и
+        create_order_with_message и None для остальных.
+        """
+        statements = [self.WRITE_OPERATIONS[name](self, *args) for name, args in operations]
+        results = [None] * len(operations)
+
+        with self._writer() as conn:
+            start = 0
+            while start < len(operations):
+                name = operations[start][0]
+
+                # Номер заявки нужен вызывающему: только по одной через lastrowid
+                if name == 'create_order':
+                    results[start] = conn.execute(*statements[start]).lastrowid
+                    start += 1
+                    continue
+
+                # Первое сообщение пишется в той же транзакции, что и заявка
+                if name == 'create_order_with_message':
+                    order_id = conn.execute(*statements[start]).lastrowid
+                    user_id, description = operations[start][1][:2]
+                    conn.execute(*self._add_message_insert(order_id, user_id, description))
+                    results[start] = order_id
+                    start += 1
+                    continue
+
+                end = start + 1
+                while end < len(operations) and operations[end][0] == name:
+                    end += 1
+                conn.executemany(statements[start][0], [params for sql, params in statements[start:end]])
+                start = end
+
+        for (name, args), result in zip(operations, results):
+            if name in ('create_order', 'create_order_with_message'):
+                # Номер мог быть закэширован как несуществующий
+                self.order_cache.invalidate(result)
+            elif name == 'add_message':
+                self.order_cache.invalidate(args[0])
+
+        return results
 
-    def get_order_messages(self, order_id: int) -> List[Dict]:
-        """Получение всех сообщений по заявке"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_statistics(self) -> Dict:
+        """Получение статистики для админа (из таблицы счетчиков)"""
+        with self._reader() as conn:
+            stats = conn.execute("""
+                SELECT total_users, total_orders, new_orders, in_progress, completed,
+                       review_count, rating_sum
+                FROM statistics
+                WHERE id = 1
+            """).fetchone()
+
+        review_count = stats[5]
+        avg_rating = stats[6] / review_count if review_count else 0
+
+        return {
+            'total_users': stats[0],
+            'total_orders': stats[1],
+            'new_orders': stats[2],
+            'in_progress': stats[3],
+            'completed': stats[4],
+            'avg_rating': round(avg_rating, 2)
+        }
 
-        cursor.execute("""
-            SELECT message_text, is_from_admin, created_at
-            FROM messages
-            WHERE order_id = ?
-            ORDER BY created_at ASC
-        """, (order_id,))
+    def count_users(self) -> int:
+        """Количество пользователей"""
+        with self._reader() as conn:
+            return conn.execute("SELECT total_users FROM statistics WHERE id = 1").fetchone()[0]
+
+    def rebuild_statistics(self):
+        """Пересчет счетчиков статистики (общих и по пользователям) по данным таблиц"""
+        with self._writer() as conn:
+            conn.execute("""
+                UPDATE statistics SET
+                    total_users = (SELECT COUNT(*) FROM users),
+                    total_orders = (SELECT COUNT(*) FROM orders),
+                    new_orders = (SELECT COUNT(*) FROM orders WHERE status = 'new'),
+                    in_progress = (SELECT COUNT(*) FROM orders WHERE status = 'in_progress'),
+                    completed = (SELECT COUNT(*) FROM orders WHERE status = 'completed'),
+                    cancelled = (SELECT COUNT(*) FROM orders WHERE status = 'cancelled'),
+                    review_count = (SELECT COUNT(*) FROM reviews),
+                    rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM reviews)
+                WHERE id = 1
+            """)
+
+            conn.execute("DELETE FROM user_order_stats")
+            conn.execute("""
+                INSERT INTO user_order_stats (user_id, total_orders, new_orders, in_progress,
+                                              completed, cancelled, last_order_at)
+                SELECT user_id, COUNT(*), SUM(status = 'new'), SUM(status = 'in_progress'),
+                       SUM(status = 'completed'), SUM(status = 'cancelled'), MAX(created_at)
+                FROM orders
+                GROUP BY user_id
+            """)
 
-        messages = cursor.fetchall()
-        conn.close()
+    def get_recent_users(self, limit: int = 20) -> List[User]:
+        """Последние зарегистрированные пользователи"""
+        with self._reader() as conn:
+            return list(map(User._make, conn.execute(f"""
+                SELECT {User.COLUMNS}
+                FROM users u
+                ORDER BY u.registration_date DESC
+                LIMIT ?
+            """, (limit,))))
+
+    def get_user_ids_batch(self, after_user_id: int = 0, limit: int = 200) -> List[int]:
+        """Следующая порция ID пользователей после указанного (по возрастанию)"""
+        with self._reader() as conn:
+            rows = conn.execute("""
+                SELECT user_id FROM users
+                WHERE user_id > ?
+                ORDER BY user_id
+                LIMIT ?
+            """, (after_user_id, limit)).fetchall()
+
+        return [row[0] for row in rows]
+
+    def create_broadcast(self, text: str, total: int, chat_id: int, message_id: int) -> int:
+        """Создание задания рассылки"""
+        created_at = int(time.time())
+
+        with self._writer() as conn:
+            cursor = conn.execute("""
+                INSERT INTO broadcasts (text, total, chat_id, message_id, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (text, total, chat_id, message_id, created_at))
+            broadcast_id = cursor.lastrowid
+
+        return broadcast_id
+
+    def get_unfinished_broadcasts(self) -> List[Dict]:
+        """Получение незавершенных рассылок (для возобновления)"""
+        with self._reader() as conn:
+            rows = conn.execute("""
+                SELECT broadcast_id, text, cursor, total, sent, failed, chat_id, message_id
+                FROM broadcasts
+                WHERE status = 'running'
+                ORDER BY broadcast_id
+            """).fetchall()
 
         result = []
-        for msg in messages:
+        for row in rows:
             result.append({
-                'message_text': msg[0],
-                'is_from_admin': msg[1],
-                'created_at': msg[2]
+                'broadcast_id': row[0],
+                'text': row[1],
+                'cursor': row[2],
+                'total': row[3],
+                'sent': row[4],
+                'failed': row[5],
+                'chat_id': row[6],
+                'message_id': row[7]
             })
 
         return result
 
-    def add_review(self, user_id: int, order_id: int, rating: int, comment: str):
-        """Добавление отзыва"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def save_broadcast_batch(self, broadcast_id: int, cursor: int, results: List[tuple]):
+        """Сохранение результатов порции рассылки и сдвиг курсора
+
+        results - список кортежей (user_id, is_sent, error)
+        """
+        sent = sum(1 for result in results if result[1])
+        failed = len(results) - sent
+
+        with self._writer() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO broadcast_results (broadcast_id, user_id, is_sent, error)
+                VALUES (?, ?, ?, ?)
+            """, [(broadcast_id, user_id, int(is_sent), error) for user_id, is_sent, error in results])
+            conn.execute("""
+                UPDATE broadcasts
+                SET cursor = ?, sent = sent + ?, failed = failed + ?
+                WHERE broadcast_id = ?
+            """, (cursor, sent, failed, broadcast_id))
+
+    def finish_broadcast(self, broadcast_id: int):
+        """Отметка о завершении рассылки"""
+        finished_at = int(time.time())
+
+        with self._writer() as conn:
+            conn.execute("""
+                UPDATE broadcasts
+                SET status = 'completed', finished_at = ?
+                WHERE broadcast_id = ?
+            """, (finished_at, broadcast_id))
+
+    def get_fsm_state(self, chat_id: int, user_id: int) -> Optional[Dict]:
+        """Получение сохраненного состояния FSM"""
+        with self._reader() as conn:
+            row = conn.execute("""
+                SELECT state, data, updated_at
+                FROM fsm_states
+                WHERE chat_id = ? AND user_id = ?
+            """, (chat_id, user_id)).fetchone()
+
+        if row:
+            return {
+                'state': row[0],
+                'data': json.loads(row[1]),
+                'updated_at': row[2]
+            }
+        return None
 
-        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def save_fsm_states(self, states: List[tuple]):
+        """Сохранение состояний FSM одной транзакцией
+
+        states - список кортежей (chat_id, user_id, state, data, updated_at).
+        Пустые состояния (без state и data) удаляются из таблицы.
+        """
+        upserts = []
+        deletes = []
+        for chat_id, user_id, state, data, updated_at in states:
+            if state is None and not data:
+                deletes.append((chat_id, user_id))
+            else:
+                upserts.append((chat_id, user_id, state, json.dumps(data, ensure_ascii=False), updated_at))
+
+        with self._writer() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO fsm_states (chat_id, user_id, state, data, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, upserts)
+            conn.executemany("DELETE FROM fsm_states WHERE chat_id = ? AND user_id = ?", deletes)
+
+    def delete_expired_fsm_states(self, updated_before: int) -> int:
+        """Удаление состояний FSM, не изменявшихся с указанного момента"""
+        with self._writer() as conn:
+            cursor = conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (updated_before,))
+            return cursor.rowcount
+
+    def add_failed_notification(self, chat_id: int, text: str, error: str, attempts: int):
+        """Сохранение недоставленного уведомления"""
+        created_at = int(time.time())
+
+        with self._writer() as conn:
+            conn.execute("""
+                INSERT INTO failed_notifications (chat_id, text, error, attempts, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (chat_id, text, error, attempts, created_at))
+
+
+class WriteQueue:
+    """Групповая запись вставок (group commit)
+
+    Вставки из разных обработчиков копятся несколько миллисекунд (или до
+    batch_size штук) и записываются в БД одной транзакцией. Вызывающий
+    ждет завершения записи и получает результат своей вставки (номер
+    заявки для create_order и create_order_with_message).
+    """
+
+    def __init__(self, run, write_batch,
+                 batch_delay: float = DB_WRITE_BATCH_DELAY,
+                 batch_size: int = DB_WRITE_BATCH_SIZE):
+        self._run = run
+        self._write_batch = write_batch
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+
+        self._queue = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        """Запуск фоновой записи при первой вставке"""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run_worker())
+
+    async def submit(self, name: str, args: tuple):
+        """Постановка вставки в очередь и ожидание ее записи в БД"""
+        # Проверяем сразу: неизвестная операция не должна попасть в пачку к остальным
+        if name not in Database.WRITE_OPERATIONS:
+            raise ValueError(f"Неизвестная операция записи: {name}")
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((name, args, future))
+        return await future
+
+    def _take(self, batch: list) -> bool:
+        """Добор вставок из очереди; True - получен сигнал остановки"""
+        while len(batch) < self.batch_size and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is None:
+                return True
+            batch.append(item)
+        return False
+
+    async def _run_worker(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stopping = self._take(batch)
+
+            # Пока вставок мало, ждем следующие, чтобы записать их вместе
+            if not stopping and len(batch) < self.batch_size and self.batch_delay > 0:
+                await asyncio.sleep(self.batch_delay)
+                stopping = self._take(batch)
+
+            await self._commit(batch)
+            if stopping:
+                return
+
+    async def _commit(self, batch: list):
+        try:
+            results = await self._run(self._write_batch, [(name, args) for name, args, future in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self._resolve(batch[0][2], error=e)
+                return
+
+            # Ошибка одной вставки не должна отменять остальные: повтор по одной
+            logger.warning(f"Ошибка групповой записи ({len(batch)} вставок), запись по одной: {e}")
+            for item in batch:
+                await self._commit([item])
+            return
+
+        for (name, args, future), result in zip(batch, results):
+            self._resolve(future, result)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result=None, error: Exception = None):
+        # Вызывающий мог быть отменен, пока шла запись
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
 
-        cursor.execute("""
-            INSERT INTO reviews (user_id, order_id, rating, comment, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user_id, order_id, rating, comment, created_at))
+    async def close(self):
+        """Запись оставшихся вставок и остановка фоновой задачи"""
+        if self._worker is None:
+            return
 
-        conn.commit()
-        conn.close()
+        # Сигнал остановки встает в очередь после всех принятых вставок
+        self._queue.put_nowait(None)
+        await self._worker
+        self._worker = None
 
-    def get_statistics(self) -> Dict:
-        """Получение статистики для админа"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
 
-        # Общее количество пользователей
-        cursor.execute("SELECT COUNT(*) FROM users")
-        total_users = cursor.fetchone()[0]
+class AsyncDatabase:
+    """Асинхронный доступ к БД: запросы Database выполняются в отдельном потоке,
+    чтобы не блокировать цикл событий бота"""
 
-        # Общее количество заявок
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        total_orders = cursor.fetchone()[0]
+    def __init__(self, db_name: str, read_connections: int = DB_READ_CONNECTIONS):
+        self.db = Database(db_name, read_connections=read_connections)
+        # Потоков на одно больше, чем читателей: запись не ждет освобождения пула чтения
+        self._executor = ThreadPoolExecutor(max_workers=read_connections + 1, thread_name_prefix="db")
+        self._writes = WriteQueue(self._run, self.db.write_batch)
 
-        # Новые заявки
-        cursor.execute("SELECT COUNT(*) FROM orders WHERE status = 'new'")
-        new_orders = cursor.fetchone()[0]
+    async def _run(self, func, *args, **kwargs):
+        """Выполнение синхронного метода в пуле потоков БД"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
 
-        # В работе
-        cursor.execute("SELECT COUNT(*) FROM orders WHERE status = 'in_progress'")
-        in_progress = cursor.fetchone()[0]
+    async def close(self):
+        """Запись очереди вставок, остановка пула потоков и закрытие подключений"""
+        await self._writes.close()
+        self._executor.shutdown(wait=True)
+        self.db.close()
 
-        # Завершенные
-        cursor.execute("SELECT COUNT(*) FROM orders WHERE status = 'completed'")
-        completed = cursor.fetchone()[0]
+    def order_cache_stats(self) -> Dict:
+        """Счетчики кэша заявок (без обращения к БД)"""
+        return self.db.order_cache.stats()
 
-        # Средняя оценка
-        cursor.execute("SELECT AVG(rating) FROM reviews")
-        avg_rating = cursor.fetchone()[0] or 0
+    async def add_user(self, user_id: int, username: str, first_name: str, last_name: str):
+        return await self._writes.submit('add_user', (user_id, username, first_name, last_name))
 
-        conn.close()
+    async def update_user_profiles(self, profiles: List[tuple]):
+        return await self._run(self.db.update_user_profiles, profiles)
 
-        return {
-            'total_users': total_users,
-            'total_orders': total_orders,
-            'new_orders': new_orders,
-            'in_progress': in_progress,
-            'completed': completed,
-            'avg_rating': round(avg_rating, 2)
-        }
+    async def get_user(self, user_id: int) -> Optional[User]:
+        return await self._run(self.db.get_user, user_id)
 
-    def get_all_users(self) -> List[Dict]:
-        """Получение всех пользователей"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    async def create_order(self, user_id: int, description: str, budget: str = "") -> int:
+        return await self._writes.submit('create_order', (user_id, description, budget))
 
-        cursor.execute("""
-            SELECT user_id, username, first_name, last_name, registration_date
-            FROM users
-            ORDER BY registration_date DESC
-        """)
+    async def create_order_with_message(self, user_id: int, description: str, budget: str = "") -> int:
+        return await self._writes.submit('create_order_with_message', (user_id, description, budget))
 
-        users = cursor.fetchall()
-        conn.close()
+    async def get_user_orders(self, user_id: int, status: str = None, limit: int = None) -> List[Order]:
+        return await self._run(self.db.get_user_orders, user_id, status, limit)
 
-        result = []
-        for user in users:
-            result.append({
-                'user_id': user[0],
-                'username': user[1],
-                'first_name': user[2],
-                'last_name': user[3],
-                'registration_date': user[4]
-            })
+    async def get_user_summary(self, user_id: int) -> Optional[UserSummary]:
+        return await self._run(self.db.get_user_summary, user_id)
 
-        return result
+    async def search_users(self, text: str, limit: int = 10) -> List[UserSummary]:
+        return await self._run(self.db.search_users, text, limit)
+
+    async def get_order(self, order_id: int) -> Optional[Order]:
+        return await self._run(self.db.get_order, order_id)
+
+    async def update_order_status(self, order_id: int, status: str, admin_comment: str = ""):
+        return await self._run(self.db.update_order_status, order_id, status, admin_comment)
+
+    async def get_all_orders(self, status: str = None) -> List[Order]:
+        return await self._run(self.db.get_all_orders, status)
+
+    async def get_orders_page(self, status: str = None, cursor: int = None,
+                              backward: bool = False, limit: int = 5, user_id: int = None) -> Dict:
+        return await self._run(self.db.get_orders_page, status, cursor, backward, limit, user_id)
+
+    async def count_orders(self, status: str = None) -> int:
+        return await self._run(self.db.count_orders, status)
+
+    async def add_message(self, order_id: int, user_id: int, message_text: str, is_from_admin: bool = False):
+        return await self._writes.submit('add_message', (order_id, user_id, message_text, is_from_admin))
+
+    async def search_orders(self, text: str) -> Dict:
+        return await self._run(self.db.search_orders, text)
+
+    async def get_order_hits(self, text: str, order_ids: List[int]) -> List[OrderHit]:
+        return await self._run(self.db.get_order_hits, text, order_ids)
+
+    async def get_order_messages(self, order_id: int, limit: int = None,
+                                 before_message_id: int = None) -> List[Message]:
+        return await self._run(self.db.get_order_messages, order_id, limit, before_message_id)
+
+    async def get_messages_page(self, order_id: int, before_message_id: int = None, limit: int = 5) -> Dict:
+        return await self._run(self.db.get_messages_page, order_id, before_message_id, limit)
+
+    async def add_review(self, user_id: int, order_id: int, rating: int, comment: str):
+        return await self._writes.submit('add_review', (user_id, order_id, rating, comment))
+
+    async def get_statistics(self) -> Dict:
+        return await self._run(self.db.get_statistics)
+
+    async def count_users(self) -> int:
+        return await self._run(self.db.count_users)
+
+    async def rebuild_statistics(self):
+        return await self._run(self.db.rebuild_statistics)
+
+    async def get_recent_users(self, limit: int = 20) -> List[User]:
+        return await self._run(self.db.get_recent_users, limit)
+
+    async def get_user_ids_batch(self, after_user_id: int = 0, limit: int = 200) -> List[int]:
+        return await self._run(self.db.get_user_ids_batch, after_user_id, limit)
+
+    async def iter_user_id_batches(self, after_user_id: int = 0, batch_size: int = 200) -> AsyncIterator[List[int]]:
+        """Асинхронный перебор ID пользователей порциями, начиная после указанного"""
+        while True:
+            user_ids = await self.get_user_ids_batch(after_user_id, batch_size)
+            if not user_ids:
+                return
+            yield user_ids
+            after_user_id = user_ids[-1]
+
+    async def create_broadcast(self, text: str, total: int, chat_id: int, message_id: int) -> int:
+        return await self._run(self.db.create_broadcast, text, total, chat_id, message_id)
+
+    async def get_unfinished_broadcasts(self) -> List[Dict]:
+        return await self._run(self.db.get_unfinished_broadcasts)
+
+    async def save_broadcast_batch(self, broadcast_id: int, cursor: int, results: List[tuple]):
+        return await self._run(self.db.save_broadcast_batch, broadcast_id, cursor, results)
+
+    async def finish_broadcast(self, broadcast_id: int):
+        return await self._run(self.db.finish_broadcast, broadcast_id)
+
+    async def get_fsm_state(self, chat_id: int, user_id: int) -> Optional[Dict]:
+        return await self._run(self.db.get_fsm_state, chat_id, user_id)
+
+    async def save_fsm_states(self, states: List[tuple]):
+        return await self._run(self.db.save_fsm_states, states)
+
+    async def delete_expired_fsm_states(self, updated_before: int) -> int:
+        return await self._run(self.db.delete_expired_fsm_states, updated_before)
+
+    async def add_failed_notification(self, chat_id: int, text: str, error: str, attempts: int):
+        return await self._run(self.db.add_failed_notification, chat_id, text, error, attempts)
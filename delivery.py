@@ -0,0 +1,55 @@
+"""
+Отправка сообщения с повторами
+
+Общая логика для уведомлений и рассылки: какие ошибки Telegram стоит
+повторять, а какие - нет, и сколько ждать перед повтором.
+"""
+
+import asyncio
+from typing import Optional, Tuple
+
+from aiogram import Bot
+from aiogram.utils.exceptions import (
+    BadRequest, NetworkError, RestartingTelegram, RetryAfter, TelegramAPIError, Unauthorized
+)
+
+
+# Отправка сообщения с повторами при временных ошибках
+async def send_with_retry(bot: Bot, chat_id: int, text: str,
+                          max_attempts: int, retry_delay: float,
+                          limiter=None, **kwargs) -> Tuple[bool, Optional[str], int]:
+    """Отправка сообщения: возвращает (отправлено ли, текст ошибки, число попыток)
+
+    limiter - общий ограничитель скорости (TokenBucket рассылки): перед
+    каждой попыткой ждем разрешения, а ответ RetryAfter приостанавливает
+    все отправки через него. Без ограничителя RetryAfter выжидается здесь.
+    Ожидание перед повтором пропускается, если попытка была последней.
+    """
+    error = None
+
+    for attempt in range(1, max_attempts + 1):
+        if limiter is not None:
+            await limiter.acquire()
+
+        has_next = attempt < max_attempts
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return True, None, attempt
+        except RetryAfter as e:
+            # Лимит Telegram
+            error = str(e)
+            if limiter is not None:
+                limiter.pause(e.timeout)
+            elif has_next:
+                await asyncio.sleep(e.timeout)
+        except (Unauthorized, BadRequest) as e:
+            # Бот заблокирован, чат не найден и т.п. - повтор бесполезен
+            return False, str(e), attempt
+        except (NetworkError, RestartingTelegram, asyncio.TimeoutError) as e:
+            error = str(e) or e.__class__.__name__
+            if has_next:
+                await asyncio.sleep(retry_delay * 2 ** (attempt - 1))
+        except TelegramAPIError as e:
+            return False, str(e), attempt
+
+    return False, error, max_attempts
@@ -0,0 +1,236 @@
+"""
+Хранилище состояний FSM в SQLite
+
+Состояния читаются из ограниченного LRU-кэша в памяти, изменения
+записываются в БД пачками в фоне (write-behind). Диалоги, которые не
+менялись дольше FSM_STATE_TTL, удаляются из кэша и из БД.
+
+Пользователи без состояния (большая часть трафика) в кэш состояний не
+попадают: для них хранится только ключ в отдельном кэше пустых
+состояний, чтобы не читать БД на каждое обновление и не вытеснять
+из кэша незаконченные диалоги.
+"""
+
+import asyncio
+import copy
+import logging
+import time
+import typing
+from collections import OrderedDict
+
+from aiogram.dispatcher.storage import BaseStorage
+
+from config import (FSM_STATE_TTL, FSM_CACHE_SIZE, FSM_EMPTY_CACHE_SIZE,
+                    FSM_FLUSH_INTERVAL, FSM_CLEANUP_INTERVAL)
+from database import AsyncDatabase
+
+
+logger = logging.getLogger(__name__)
+
+# Общее представление отсутствующего состояния (не изменяется)
+EMPTY_ENTRY = {'state': None, 'data': {}, 'updated_at': 0}
+
+
+class SQLiteStorage(BaseStorage):
+    """Постоянное хранилище FSM с кэшем и отложенной записью"""
+
+    def __init__(self, db: AsyncDatabase,
+                 ttl: int = FSM_STATE_TTL,
+                 cache_size: int = FSM_CACHE_SIZE,
+                 empty_cache_size: int = FSM_EMPTY_CACHE_SIZE,
+                 flush_interval: float = FSM_FLUSH_INTERVAL,
+                 cleanup_interval: float = FSM_CLEANUP_INTERVAL):
+        self.db = db
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.empty_cache_size = empty_cache_size
+        self.flush_interval = flush_interval
+        self.cleanup_interval = cleanup_interval
+
+        # (chat_id, user_id) -> {'state': ..., 'data': ..., 'updated_at': ...}
+        self._cache = OrderedDict()
+        # Ключи (chat_id, user_id), для которых состояния нет ни в кэше, ни в БД
+        self._empty = OrderedDict()
+        self._dirty = set()
+        self._worker = None
+
+    def _ensure_worker(self):
+        """Запуск фоновой записи и очистки при первом обращении"""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run_worker())
+
+    async def _run_worker(self):
+        last_cleanup = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._flush()
+                if time.monotonic() - last_cleanup >= self.cleanup_interval:
+                    last_cleanup = time.monotonic()
+                    await self._cleanup()
+            except Exception:
+                logger.exception("Ошибка записи состояний FSM")
+
+    async def _flush(self):
+        """Запись измененных состояний в БД"""
+        if not self._dirty:
+            return
+
+        keys, self._dirty = self._dirty, set()
+        states = []
+        for key in keys:
+            entry = self._cache.get(key)
+            if entry is not None:
+                states.append((key[0], key[1], entry['state'], entry['data'], entry['updated_at']))
+
+        try:
+            await self.db.save_fsm_states(states)
+        except Exception:
+            # Не потерять изменения: повторим при следующей записи
+            self._dirty |= keys
+            raise
+
+        # Пустые состояния удалены из БД: в кэше состояний они больше не нужны
+        for key in keys:
+            entry = self._cache.get(key)
+            if entry is not None and key not in self._dirty and entry['state'] is None and not entry['data']:
+                del self._cache[key]
+                self._remember_empty(key)
+
+        self._shrink()
+
+    async def _cleanup(self):
+        """Удаление диалогов, простаивающих дольше TTL"""
+        expired_before = int(time.time()) - self.ttl
+
+        for key in [key for key, entry in self._cache.items() if entry['updated_at'] < expired_before]:
+            if key not in self._dirty:
+                del self._cache[key]
+                self._remember_empty(key)
+
+        removed = await self.db.delete_expired_fsm_states(expired_before)
+        if removed:
+            logger.info(f"Удалено устаревших состояний FSM: {removed}")
+
+    def _shrink(self, keep: tuple = None):
+        """Вытеснение давно не использованных записей сверх лимита кэша"""
+        for key in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            # Несохраненные записи остаются до следующей записи в БД
+            if key not in self._dirty and key != keep:
+                del self._cache[key]
+
+    def _remember_empty(self, key: tuple):
+        """Запоминание ключа без состояния (кэш ограничен, вытесняются давние)"""
+        self._empty[key] = None
+        self._empty.move_to_end(key)
+        if len(self._empty) > self.empty_cache_size:
+            self._empty.popitem(last=False)
+
+    def _key(self, chat, user) -> tuple:
+        return tuple(map(int, self.check_address(chat=chat, user=user)))
+
+    async def _get_entry(self, chat, user) -> dict:
+        """Запись состояния для чтения (EMPTY_ENTRY, если состояния нет)"""
+        key = self._key(chat, user)
+        self._ensure_worker()
+
+        if key in self._empty:
+            self._empty.move_to_end(key)
+            return EMPTY_ENTRY
+
+        entry = self._cache.get(key)
+        if entry is None:
+            row = await self.db.get_fsm_state(*key)
+
+            # Пока шел запрос, запись могла появиться в кэше
+            entry = self._cache.get(key)
+            if entry is None:
+                if row is None or row['updated_at'] < time.time() - self.ttl:
+                    self._remember_empty(key)
+                    return EMPTY_ENTRY
+                entry = self._cache[key] = row
+                self._shrink(keep=key)
+
+        self._cache.move_to_end(key)
+        return entry
+
+    async def _get_entry_for_update(self, chat, user) -> dict:
+        """Запись состояния для изменения (создается, если состояния нет)"""
+        entry = await self._get_entry(chat, user)
+        if entry is EMPTY_ENTRY:
+            key = self._key(chat, user)
+            self._empty.pop(key, None)
+            entry = self._cache[key] = {'state': None, 'data': {}, 'updated_at': int(time.time())}
+            self._shrink(keep=key)
+        return entry
+
+    def _mark_dirty(self, chat, user, entry: dict):
+        entry['updated_at'] = int(time.time())
+        self._dirty.add(self._key(chat, user))
+
+    async def close(self):
+        """Остановка фоновой задачи и запись всех изменений"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        await self._flush()
+        self._cache.clear()
+        self._empty.clear()
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        entry = await self._get_entry(chat, user)
+        return entry['state'] or self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        entry = await self._get_entry(chat, user)
+        return copy.deepcopy(entry['data'] or default or {})
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.Optional[typing.AnyStr] = None):
+        state = self.resolve_state(state)
+
+        # Сброс отсутствующего состояния (state.finish() вне диалога) ничего не меняет
+        if state is None and await self._get_entry(chat, user) is EMPTY_ENTRY:
+            return
+
+        entry = await self._get_entry_for_update(chat, user)
+        entry['state'] = state
+        self._mark_dirty(chat, user, entry)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        if not data and await self._get_entry(chat, user) is EMPTY_ENTRY:
+            return
+
+        entry = await self._get_entry_for_update(chat, user)
+        entry['data'] = copy.deepcopy(data or {})
+        self._mark_dirty(chat, user, entry)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None,
+                          **kwargs):
+        entry = await self._get_entry_for_update(chat, user)
+        entry['data'].update(copy.deepcopy(data or {}), **kwargs)
+        self._mark_dirty(chat, user, entry)
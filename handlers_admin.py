@@ -1,9 +1,23 @@
+import html
 from aiogram import types, Dispatcher
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from database import Database
+from aiogram.utils.exceptions import MessageNotModified
+from database import AsyncDatabase
+from models import Order, UserSummary
+from known_users import KnownUsers
+from broadcast import BroadcastEngine
+from callback_router import CallbackRouter
+from callback_data import (
+    ADMIN_ORDER, ADMIN_STATUS, ADMIN_MESSAGE, ADMIN_COMMENT, ADMIN_BACK_TO_ORDERS, ORDER_HISTORY,
+    ORDERS_PAGE, ORDERS_FILTER, BROADCAST_CONFIRM, BROADCAST_CANCEL, SEARCH_PAGE,
+    USER_CARD, USER_ORDERS, USER_ORDERS_PAGE
+)
+from notifications import NotificationQueue
+from utils import format_timestamp, format_snippet
+from handlers_user import cmd_start
 from keyboards import *
-from config import ADMIN_ID, DB_NAME
+from config import ADMIN_ID
 
 
 # Состояния для админа
@@ -11,10 +25,8 @@ class AdminStates(StatesGroup):
     waiting_for_comment = State()
     waiting_for_message = State()
     waiting_for_broadcast = State()
-
-
-# Инициализация БД
-db = Database(DB_NAME)
+    waiting_for_search = State()
+    waiting_for_user_search = State()
 
 
 # Проверка, является ли пользователь админом
@@ -38,11 +50,12 @@ async def cmd_admin(message: types.Message):
 
 
 # Показать статистику
-async def show_statistics(message: types.Message):
+async def show_statistics(message: types.Message, db: AsyncDatabase):
     if not is_admin(message.from_user.id):
         return
 
-    stats = db.get_statistics()
+    stats = await db.get_statistics()
+    cache = db.order_cache_stats()
 
     stats_text = f"""
 📊 Статистика бота
@@ -56,55 +69,237 @@ async def show_statistics(message: types.Message):
 • ✅ Завершенные: {stats['completed']}
 
 ⭐ Средняя оценка: {stats['avg_rating']}/5.0
+
+🗄 Кэш заявок: {cache['size']} шт., попаданий {cache['hits']}, промахов {cache['misses']} ({cache['hit_rate']}%)
     """
 
     await message.answer(stats_text, reply_markup=admin_main_menu())
 
 
+# Пересчет счетчиков статистики
+async def cmd_rebuild_stats(message: types.Message, db: AsyncDatabase):
+    if not is_admin(message.from_user.id):
+        return
+
+    await db.rebuild_statistics()
+
+    await message.answer("✅ Счетчики статистики пересчитаны", reply_markup=admin_main_menu())
+
+
+# Заголовки списков заявок
+ORDER_LIST_TITLES = {
+    'all': '📋 Все заявки',
+    'new': '🆕 Новые заявки',
+    'in_progress': '🔄 Заявки в работе',
+    'completed': '✅ Завершенные заявки',
+    'cancelled': '❌ Отмененные заявки'
+}
+
+
+# Количество сообщений переписки на одной странице
+MESSAGES_PAGE_SIZE = 5
+
+
+# Текст и клавиатура страницы списка заявок
+async def build_orders_page(db: AsyncDatabase, status_filter: str = "all", cursor: int = None, backward: bool = False):
+    status = None if status_filter == "all" else status_filter
+
+    total = await db.count_orders(status)
+    page = await db.get_orders_page(status, cursor, backward)
+
+    text = f"{ORDER_LIST_TITLES[status_filter]} (всего: {total})\n\nВыберите заявку для просмотра:"
+
+    return total, text, admin_orders_list(page, status_filter)
+
+
 # Показать все заявки
-async def show_all_orders(message: types.Message):
+async def show_all_orders(message: types.Message, db: AsyncDatabase):
     if not is_admin(message.from_user.id):
         return
 
-    orders = db.get_all_orders()
+    total, text, keyboard = await build_orders_page(db, "all")
 
-    if not orders:
+    if not total:
         await message.answer("Заявок пока нет.", reply_markup=admin_main_menu())
         return
 
-    text = f"📋 Все заявки (всего: {len(orders)})\n\nВыберите заявку для просмотра:"
-
-    await message.answer(text, reply_markup=admin_orders_list(orders))
+    await message.answer(text, reply_markup=keyboard)
 
 
 # Показать новые заявки
-async def show_new_orders(message: types.Message):
+async def show_new_orders(message: types.Message, db: AsyncDatabase):
     if not is_admin(message.from_user.id):
         return
 
-    orders = db.get_all_orders(status='new')
+    total, text, keyboard = await build_orders_page(db, "new")
 
-    if not orders:
+    if not total:
         await message.answer("Новых заявок нет.", reply_markup=admin_main_menu())
         return
 
-    text = f"🆕 Новые заявки (всего: {len(orders)})\n\nВыберите заявку для просмотра:"
+    await message.answer(text, reply_markup=keyboard)
+
 
-    await message.answer(text, reply_markup=admin_orders_list(orders))
+# Фильтр списка заявок по статусу
+async def admin_filter_orders(callback: types.CallbackQuery, status_filter: str, db: AsyncDatabase):
+    if not is_admin(callback.from_user.id):
+        return
+
+    total, text, keyboard = await build_orders_page(db, status_filter)
+
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except MessageNotModified:
+        # Повторное нажатие на текущий фильтр
+        pass
+    await callback.answer()
+
+
+# Переключение страниц списка заявок
+async def admin_orders_page(callback: types.CallbackQuery, direction: str, cursor: int, status_filter: str,
+                            db: AsyncDatabase):
+    if not is_admin(callback.from_user.id):
+        return
+
+    total, text, keyboard = await build_orders_page(db, status_filter, cursor, direction == "prev")
+
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
+
+
+# Результатов поиска на странице
+SEARCH_PAGE_SIZE = 5
+
+
+# Текст и клавиатура страницы результатов поиска
+async def build_search_page(db: AsyncDatabase, query: str, result: dict, offset: int = 0):
+    matches = result['matches']
+    hits = await db.get_order_hits(query, matches[offset:offset + SEARCH_PAGE_SIZE])
+
+    if not hits:
+        return None, None
+
+    found = "показано" if result['truncated'] else "найдено"
+    text = f"🔍 Результаты поиска «{html.escape(query)}» ({found}: {len(matches)}):\n"
+    if not result['ranked']:
+        text += "\n⚠️ Слишком частые слова: показаны заявки с самыми новыми совпадениями, без сортировки по релевантности.\n"
+    elif result['truncated']:
+        text += f"\n⚠️ Показаны {len(matches)} самых релевантных заявок.\n"
+
+    for number, hit in enumerate(hits, offset + 1):
+        text += f"\n{number}. {STATUS_EMOJI.get(hit.status, '📋')} Заявка #{hit.order_id} от {html.escape(hit.first_name or '')}"
+        text += f" ({format_timestamp(hit.created_at)})\n{format_snippet(hit.snippet)}\n"
+
+    has_more = offset + SEARCH_PAGE_SIZE < len(matches)
+    return text, search_results_buttons(hits, offset, SEARCH_PAGE_SIZE, has_more)
+
+
+# Поиск заявок по тексту
+async def start_search(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return
+
+    text = """
+🔍 Поиск заявок
+
+Напишите слова для поиска: по описанию заявки, комментарию или переписке с клиентом.
+Можно вводить начало слова, например "shop" найдет "Shopify".
+    """
+
+    await message.answer(text, reply_markup=back_to_main())
+    await AdminStates.waiting_for_search.set()
+
+
+# Команда /search <текст>
+async def cmd_search(message: types.Message, state: FSMContext, db: AsyncDatabase):
+    if not is_admin(message.from_user.id):
+        return
+
+    query = message.get_args()
+    if not query:
+        await start_search(message)
+        return
+
+    await show_search_results(message, state, db, query)
+
+
+# Обработка текста поиска
+async def process_search_query(message: types.Message, state: FSMContext, db: AsyncDatabase):
+    if not is_admin(message.from_user.id):
+        return
+
+    if message.text == "🔙 Главное меню":
+        await state.finish()
+        await message.answer("Админ-панель", reply_markup=admin_main_menu())
+        return
+
+    await show_search_results(message, state, db, message.text)
+
+
+# Первая страница результатов поиска
+async def show_search_results(message: types.Message, state: FSMContext, db: AsyncDatabase, query: str):
+    await state.finish()
+
+    # Поиск выполняется один раз, страницы листают сохраненный список заявок
+    result = await db.search_orders(query)
+    text, keyboard = await build_search_page(db, query, result)
+
+    if text is None:
+        await message.answer("🔍 Ничего не найдено. Попробуйте другие слова.", reply_markup=admin_main_menu())
+        return
+
+    # Запрос и результаты не помещаются в callback_data, страницы берут их из данных FSM
+    await state.update_data(search_query=query, search_result=result)
+    await message.answer(text, reply_markup=keyboard)
+
+
+# Переключение страниц результатов поиска
+async def search_page_callback(callback: types.CallbackQuery, offset: int, state: FSMContext, db: AsyncDatabase):
+    if not is_admin(callback.from_user.id):
+        return
+
+    data = await state.get_data()
+    query = data.get('search_query')
+    result = data.get('search_result')
+
+    text, keyboard = await build_search_page(db, query, result, offset) if query and result else (None, None)
+
+    if text is None:
+        await callback.answer("⚠️ Результаты поиска устарели. Выполните поиск заново.", show_alert=True)
+        return
+
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
+
+
+# Текст сообщений переписки
+def format_messages(messages: list) -> str:
+    text = ""
+    for msg in messages:
+        sender = "👨‍💼 Вы" if msg.is_from_admin else "👤 Клиент"
+        text += f"\n{sender} ({format_timestamp(msg.created_at)}):\n{msg.message_text}\n"
+    return text
 
 
 # Просмотр конкретной заявки (для админа)
-async def admin_view_order(callback: types.CallbackQuery):
+async def admin_view_order(callback: types.CallbackQuery, order_id: int, db: AsyncDatabase):
     if not is_admin(callback.from_user.id):
         return
 
-    order_id = int(callback.data.split("_")[2])
-    order = db.get_order(order_id)
+    order = await db.get_order(order_id)
 
     if not order:
         await callback.answer("Заявка не найдена", show_alert=True)
         return
 
+    await show_admin_order(callback, order, db)
+    await callback.answer()
+
+
+# Карточка заявки с кнопками управления
+async def show_admin_order(callback: types.CallbackQuery, order: Order, db: AsyncDatabase):
+    order_id = order.order_id
+
     status_text = {
         'new': '🆕 Новая',
         'in_progress': '🔄 В работе',
@@ -113,50 +308,62 @@ async def admin_view_order(callback: types.CallbackQuery):
     }
 
     order_text = f"""
-📋 Заявка #{order['order_id']}
+📋 Заявка #{order.order_id}
 
-👤 Клиент: {order['first_name']} (@{order['username']})
-🆔 User ID: {order['user_id']}
+👤 Клиент: {order.first_name} (@{order.username})
+🆔 User ID: {order.user_id}
 
-📅 Создана: {order['created_at']}
-🔄 Обновлена: {order['updated_at']}
-📊 Статус: {status_text.get(order['status'], order['status'])}
+📅 Создана: {format_timestamp(order.created_at)}
+🔄 Обновлена: {format_timestamp(order.updated_at)}
+📊 Статус: {status_text.get(order.status, order.status)}
 
 📝 Описание:
-{order['description']}
+{order.description}
     """
 
-    if order['budget']:
-        order_text += f"\n💰 Бюджет: {order['budget']}"
+    if order.budget:
+        order_text += f"\n💰 Бюджет: {order.budget}"
 
-    if order['admin_comment']:
-        order_text += f"\n\n💬 Ваш комментарий:\n{order['admin_comment']}"
+    if order.admin_comment:
+        order_text += f"\n\n💬 Ваш комментарий:\n{order.admin_comment}"
 
-    # Показываем историю сообщений
-    messages = db.get_order_messages(order_id)
-    if messages:
-        order_text += "\n\n📨 История сообщений:\n"
-        for msg in messages[-5:]:  # Последние 5 сообщений
-            sender = "👨‍💼 Вы" if msg['is_from_admin'] else "👤 Клиент"
-            order_text += f"\n{sender} ({msg['created_at']}):\n{msg['message_text']}\n"
+    # Показываем последние сообщения (более ранние - по кнопке)
+    page = await db.get_messages_page(order_id, limit=MESSAGES_PAGE_SIZE)
+    if page['messages']:
+        order_text += "\n\n📨 История сообщений:\n" + format_messages(page['messages'])
+
+    older_cursor = page['messages'][0].message_id if page['has_older'] else None
 
     await callback.message.edit_text(
         order_text,
-        reply_markup=admin_order_buttons(order_id, order['status'])
+        reply_markup=admin_order_buttons(order_id, order.status, older_cursor)
     )
-    await callback.answer()
 
 
-# Изменение статуса заявки
-async def admin_change_status(callback: types.CallbackQuery):
+# Более ранние сообщения по заявке
+async def admin_order_history(callback: types.CallbackQuery, order_id: int, before_message_id: int,
+                              db: AsyncDatabase):
     if not is_admin(callback.from_user.id):
         return
 
-    data = callback.data.split("_")
-    order_id = int(data[2])
-    new_status = data[3]
+    page = await db.get_messages_page(order_id, before_message_id, MESSAGES_PAGE_SIZE)
 
-    order = db.get_order(order_id)
+    if not page['messages']:
+        await callback.answer("Более ранних сообщений нет")
+        return
+
+    text = f"📨 Заявка #{order_id}: более ранние сообщения\n" + format_messages(page['messages'])
+    older_cursor = page['messages'][0].message_id if page['has_older'] else None
+
+    await callback.message.edit_text(text, reply_markup=order_history_buttons(order_id, older_cursor))
+    await callback.answer()
+
+
+# Изменение статуса заявки
+async def admin_change_status(callback: types.CallbackQuery, order_id: int, new_status: str, db: AsyncDatabase,
+                              notifier: NotificationQueue):
+    if not is_admin(callback.from_user.id):
+        return
 
     status_names = {
         'new': 'Новая',
@@ -165,36 +372,35 @@ async def admin_change_status(callback: types.CallbackQuery):
         'cancelled': 'Отменена'
     }
 
-    # Обновляем статус
-    db.update_order_status(order_id, new_status)
+    # Обновляем статус и один раз читаем обновленную заявку
+    await db.update_order_status(order_id, new_status)
+    order = await db.get_order(order_id)
+
+    if not order:
+        await callback.answer("Заявка не найдена", show_alert=True)
+        return
 
     await callback.answer(f"Статус изменен на: {status_names[new_status]}")
 
     # Уведомляем клиента
-    try:
-        status_messages = {
-            'in_progress': f"🔄 Ваша заявка #{order_id} взята в работу!",
-            'completed': f"✅ Ваша заявка #{order_id} выполнена! Спасибо за обращение!",
-            'cancelled': f"❌ Ваша заявка #{order_id} была отменена."
-        }
-
-        if new_status in status_messages:
-            from bot import bot
-            await bot.send_message(order['user_id'], status_messages[new_status])
-    except:
-        pass
+    status_messages = {
+        'in_progress': f"🔄 Ваша заявка #{order_id} взята в работу!",
+        'completed': f"✅ Ваша заявка #{order_id} выполнена! Спасибо за обращение!",
+        'cancelled': f"❌ Ваша заявка #{order_id} была отменена."
+    }
+
+    if new_status in status_messages:
+        notifier.send(order.user_id, status_messages[new_status])
 
     # Обновляем сообщение
-    await admin_view_order(callback)
+    await show_admin_order(callback, order, db)
 
 
 # Написать комментарий к заявке
-async def admin_add_comment(callback: types.CallbackQuery, state: FSMContext):
+async def admin_add_comment(callback: types.CallbackQuery, order_id: int, state: FSMContext):
     if not is_admin(callback.from_user.id):
         return
 
-    order_id = int(callback.data.split("_")[2])
-
     await state.update_data(order_id=order_id)
     await AdminStates.waiting_for_comment.set()
 
@@ -203,7 +409,8 @@ async def admin_add_comment(callback: types.CallbackQuery, state: FSMContext):
 
 
 # Обработка комментария
-async def process_admin_comment(message: types.Message, state: FSMContext):
+async def process_admin_comment(message: types.Message, state: FSMContext, db: AsyncDatabase,
+                                notifier: NotificationQueue):
     if not is_admin(message.from_user.id):
         return
 
@@ -215,33 +422,27 @@ async def process_admin_comment(message: types.Message, state: FSMContext):
         return
 
     comment = message.text
-    order = db.get_order(order_id)
+    order = await db.get_order(order_id)
 
     # Обновляем комментарий
-    db.update_order_status(order_id, order['status'], comment)
+    await db.update_order_status(order_id, order.status, comment)
 
     await state.finish()
 
     await message.answer("✅ Комментарий добавлен!", reply_markup=admin_main_menu())
 
     # Уведомляем клиента
-    try:
-        from bot import bot
-        await bot.send_message(
-            order['user_id'],
-            f"💬 Новый комментарий по заявке #{order_id}:\n\n{comment}"
-        )
-    except:
-        pass
+    notifier.send(
+        order.user_id,
+        f"💬 Новый комментарий по заявке #{order_id}:\n\n{comment}"
+    )
 
 
 # Написать сообщение клиенту
-async def admin_send_message(callback: types.CallbackQuery, state: FSMContext):
+async def admin_send_message(callback: types.CallbackQuery, order_id: int, state: FSMContext):
     if not is_admin(callback.from_user.id):
         return
 
-    order_id = int(callback.data.split("_")[2])
-
     await state.update_data(order_id=order_id)
     await AdminStates.waiting_for_message.set()
 
@@ -250,7 +451,8 @@ async def admin_send_message(callback: types.CallbackQuery, state: FSMContext):
 
 
 # Обработка сообщения клиенту
-async def process_admin_message(message: types.Message, state: FSMContext):
+async def process_admin_message(message: types.Message, state: FSMContext, db: AsyncDatabase,
+                                notifier: NotificationQueue):
     if not is_admin(message.from_user.id):
         return
 
@@ -262,47 +464,180 @@ async def process_admin_message(message: types.Message, state: FSMContext):
         return
 
     message_text = message.text
-    order = db.get_order(order_id)
+    order = await db.get_order(order_id)
 
     # Сохраняем сообщение
-    db.add_message(order_id, ADMIN_ID, message_text, True)
+    await db.add_message(order_id, ADMIN_ID, message_text, True)
 
     await state.finish()
 
     await message.answer("✅ Сообщение отправлено!", reply_markup=admin_main_menu())
 
     # Отправляем клиенту
-    try:
-        from bot import bot
-        await bot.send_message(
-            order['user_id'],
-            f"💬 Сообщение от менеджера по заявке #{order_id}:\n\n{message_text}"
-        )
-    except:
-        pass
+    notifier.send(
+        order.user_id,
+        f"💬 Сообщение от менеджера по заявке #{order_id}:\n\n{message_text}"
+    )
 
 
 # Показать список пользователей
-async def show_users(message: types.Message):
+async def show_users(message: types.Message, db: AsyncDatabase):
     if not is_admin(message.from_user.id):
         return
 
-    users = db.get_all_users()
+    total = await db.count_users()
 
-    if not users:
+    if not total:
         await message.answer("Пользователей пока нет.", reply_markup=admin_main_menu())
         return
 
-    text = f"👥 Пользователи (всего: {len(users)})\n\n"
+    users = await db.get_recent_users(20)  # Показываем последних 20
 
-    for user in users[:20]:  # Показываем первых 20
-        text += f"👤 {user['first_name']} (@{user['username']})\n"
-        text += f"🆔 ID: {user['user_id']}\n"
-        text += f"📅 Регистрация: {user['registration_date']}\n\n"
+    text = f"👥 Пользователи (всего: {total})\n\n"
+
+    for user in users:
+        text += f"👤 {user.first_name} (@{user.username})\n"
+        text += f"🆔 ID: {user.user_id}\n"
+        text += f"📅 Регистрация: {format_timestamp(user.registration_date)}\n\n"
+
+    text += "🔎 Найти клиента: /find_user <имя, @username или ID>"
 
     await message.answer(text, reply_markup=admin_main_menu())
 
 
+# Найденных пользователей в ответе
+USER_SEARCH_LIMIT = 10
+
+
+# Карточка пользователя со сводкой заявок
+def format_user_card(user: UserSummary) -> str:
+    username = f"@{html.escape(user.username)}" if user.username else "нет"
+
+    return f"""
+👤 {html.escape(user.first_name or '')}
+
+🆔 User ID: {user.user_id}
+📱 Username: {username}
+📅 Регистрация: {format_timestamp(user.registration_date)}
+
+📋 Заявки: {user.total_orders}
+• 🆕 Новые: {user.new_orders}
+• 🔄 В работе: {user.in_progress}
+• ✅ Завершенные: {user.completed}
+• ❌ Отмененные: {user.cancelled}
+📅 Последняя заявка: {format_timestamp(user.last_order_at)}
+    """
+
+
+# Поиск пользователя
+async def start_user_search(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return
+
+    text = """
+🔎 Поиск пользователя
+
+Напишите User ID, username или начало имени клиента.
+    """
+
+    await message.answer(text, reply_markup=back_to_main())
+    await AdminStates.waiting_for_user_search.set()
+
+
+# Команда /find_user <ID, @username или имя>
+async def cmd_find_user(message: types.Message, state: FSMContext, db: AsyncDatabase):
+    if not is_admin(message.from_user.id):
+        return
+
+    query = message.get_args()
+    if not query:
+        await start_user_search(message)
+        return
+
+    await show_user_search_results(message, state, db, query)
+
+
+# Обработка текста поиска пользователя
+async def process_user_search(message: types.Message, state: FSMContext, db: AsyncDatabase):
+    if not is_admin(message.from_user.id):
+        return
+
+    if message.text == "🔙 Главное меню":
+        await state.finish()
+        await message.answer("Админ-панель", reply_markup=admin_main_menu())
+        return
+
+    await show_user_search_results(message, state, db, message.text)
+
+
+# Результаты поиска пользователя: сразу карточка или список для выбора
+async def show_user_search_results(message: types.Message, state: FSMContext, db: AsyncDatabase, query: str):
+    await state.finish()
+
+    users = await db.search_users(query, USER_SEARCH_LIMIT)
+
+    if not users:
+        await message.answer("🔎 Пользователь не найден.", reply_markup=admin_main_menu())
+        return
+
+    if len(users) == 1:
+        await message.answer(format_user_card(users[0]), reply_markup=admin_user_card(users[0].user_id))
+        return
+
+    text = f"🔎 Найдено пользователей: {len(users)}"
+    if len(users) == USER_SEARCH_LIMIT:
+        text += " (показаны первые, уточните запрос)"
+
+    await message.answer(text, reply_markup=user_search_results(users))
+
+
+# Карточка пользователя
+async def user_card_callback(callback: types.CallbackQuery, user_id: int, db: AsyncDatabase):
+    if not is_admin(callback.from_user.id):
+        return
+
+    user = await db.get_user_summary(user_id)
+
+    if not user:
+        await callback.answer("Пользователь не найден", show_alert=True)
+        return
+
+    await callback.message.edit_text(format_user_card(user), reply_markup=admin_user_card(user_id))
+    await callback.answer()
+
+
+# Заявки одного пользователя
+async def user_orders_callback(callback: types.CallbackQuery, user_id: int, db: AsyncDatabase):
+    if not is_admin(callback.from_user.id):
+        return
+
+    await show_user_orders_page(callback, user_id, db)
+
+
+# Переключение страниц заявок пользователя
+async def user_orders_page_callback(callback: types.CallbackQuery, direction: str, cursor: int, user_id: int,
+                                    db: AsyncDatabase):
+    if not is_admin(callback.from_user.id):
+        return
+
+    await show_user_orders_page(callback, user_id, db, cursor, direction == "prev")
+
+
+# Страница заявок пользователя
+async def show_user_orders_page(callback: types.CallbackQuery, user_id: int, db: AsyncDatabase,
+                                cursor: int = None, backward: bool = False):
+    page = await db.get_orders_page(cursor=cursor, backward=backward, user_id=user_id)
+
+    if not page['orders']:
+        await callback.answer("У пользователя нет заявок", show_alert=True)
+        return
+
+    text = f"📋 Заявки пользователя {user_id}\n\nВыберите заявку для просмотра:"
+
+    await callback.message.edit_text(text, reply_markup=admin_user_orders_list(page, user_id))
+    await callback.answer()
+
+
 # Начать рассылку
 async def start_broadcast(message: types.Message):
     if not is_admin(message.from_user.id):
@@ -321,7 +656,7 @@ async def start_broadcast(message: types.Message):
 
 
 # Обработка текста рассылки
-async def process_broadcast_text(message: types.Message, state: FSMContext):
+async def process_broadcast_text(message: types.Message, state: FSMContext, db: AsyncDatabase):
     if not is_admin(message.from_user.id):
         return
 
@@ -334,7 +669,7 @@ async def process_broadcast_text(message: types.Message, state: FSMContext):
 
     await state.update_data(broadcast_text=broadcast_text)
 
-    users_count = db.get_statistics()['total_users']
+    users_count = await db.count_users()
 
     confirm_text = f"""
 📢 Подтверждение рассылки
@@ -351,78 +686,69 @@ async def process_broadcast_text(message: types.Message, state: FSMContext):
     await message.answer(confirm_text, reply_markup=confirm_broadcast())
 
 
-# Подтверждение рассылки
-async def confirm_broadcast_callback(callback: types.CallbackQuery, state: FSMContext):
+# Отмена рассылки
+async def cancel_broadcast_callback(callback: types.CallbackQuery, state: FSMContext):
     if not is_admin(callback.from_user.id):
         return
 
-    if callback.data == "broadcast_cancel":
-        await state.finish()
-        await callback.message.edit_text("❌ Рассылка отменена")
-        await callback.message.answer("Админ-панель", reply_markup=admin_main_menu())
-        await callback.answer()
+    await state.finish()
+    await callback.message.edit_text("❌ Рассылка отменена")
+    await callback.message.answer("Админ-панель", reply_markup=admin_main_menu())
+    await callback.answer()
+
+
+# Подтверждение рассылки
+async def confirm_broadcast_callback(callback: types.CallbackQuery, state: FSMContext,
+                                     broadcast_engine: BroadcastEngine):
+    if not is_admin(callback.from_user.id):
         return
 
     data = await state.get_data()
     broadcast_text = data.get('broadcast_text')
 
-    await state.finish()
-
-    users = db.get_all_users()
-
-    await callback.message.edit_text("📤 Начинаю рассылку...")
+    # Данные диалога могли быть удалены (повторное нажатие, истек срок хранения)
+    if not broadcast_text:
+        await callback.answer("⚠️ Текст рассылки не найден. Начните рассылку заново.", show_alert=True)
+        return
 
-    success_count = 0
-    fail_count = 0
+    await state.finish()
 
-    from bot import bot
+    status_message = await callback.message.edit_text("📤 Начинаю рассылку...")
 
-    for user in users:
-        try:
-            await bot.send_message(user['user_id'], broadcast_text)
-            success_count += 1
-        except Exception as e:
-            fail_count += 1
-
-    result_text = f"""
-✅ Рассылка завершена!
-
-📊 Результаты:
-• Успешно отправлено: {success_count}
-• Не удалось отправить: {fail_count}
-    """
+    # Рассылка идет в фоне, прогресс отображается в этом же сообщении
+    await broadcast_engine.start(callback.bot, broadcast_text, status_message.chat.id, status_message.message_id)
 
-    await callback.message.answer(result_text, reply_markup=admin_main_menu())
     await callback.answer()
 
 
 # Переключение в пользовательский режим
-async def switch_to_user_mode(message: types.Message, state: FSMContext):
+async def switch_to_user_mode(message: types.Message, state: FSMContext, known_users: KnownUsers):
     if not is_admin(message.from_user.id):
         return
 
     await state.finish()
 
-    from handlers_user import cmd_start
-    await cmd_start(message)
+    await cmd_start(message, known_users)
 
 
 # Возврат к списку заявок
-async def back_to_orders(callback: types.CallbackQuery):
+async def back_to_orders(callback: types.CallbackQuery, db: AsyncDatabase):
     if not is_admin(callback.from_user.id):
         return
 
-    orders = db.get_all_orders()
-    text = f"📋 Все заявки (всего: {len(orders)})\n\nВыберите заявку для просмотра:"
+    total, text, keyboard = await build_orders_page(db, "all")
 
-    await callback.message.edit_text(text, reply_markup=admin_orders_list(orders))
+    await callback.message.edit_text(text, reply_markup=keyboard)
     await callback.answer()
 
 
 # Регистрация админских обработчиков
-def register_admin_handlers(dp: Dispatcher):
+def register_admin_handlers(dp: Dispatcher, router: CallbackRouter):
     # Команды
     dp.register_message_handler(cmd_admin, commands=['admin'], state='*')
+    dp.register_message_handler(cmd_rebuild_stats, commands=['rebuild_stats'], state='*')
+    dp.register_message_handler(cmd_search, commands=['search'], state='*')
+    dp.register_message_handler(cmd_find_user, commands=['find_user'], state='*')
 
     # Кнопки админ-панели
     dp.register_message_handler(show_statistics, text="📊 Статистика", state='*')
@@ -430,17 +756,29 @@ def register_admin_handlers(dp: Dispatcher):
     dp.register_message_handler(show_new_orders, text="🆕 Новые заявки", state='*')
     dp.register_message_handler(show_users, text="👥 Пользователи", state='*')
     dp.register_message_handler(start_broadcast, text="📢 Рассылка", state='*')
+    dp.register_message_handler(start_search, text="🔍 Поиск заявок", state='*')
+    dp.register_message_handler(start_user_search, text="🔎 Найти пользователя", state='*')
     dp.register_message_handler(switch_to_user_mode, text="👤 Пользовательский режим", state='*')
 
     # FSM обработчики
     dp.register_message_handler(process_admin_comment, state=AdminStates.waiting_for_comment)
     dp.register_message_handler(process_admin_message, state=AdminStates.waiting_for_message)
     dp.register_message_handler(process_broadcast_text, state=AdminStates.waiting_for_broadcast)
+    dp.register_message_handler(process_search_query, state=AdminStates.waiting_for_search)
+    dp.register_message_handler(process_user_search, state=AdminStates.waiting_for_user_search)
 
     # Callback обработчики
-    dp.register_callback_query_handler(admin_view_order, lambda c: c.data.startswith('admin_order_'))
-    dp.register_callback_query_handler(admin_change_status, lambda c: c.data.startswith('admin_status_'))
-    dp.register_callback_query_handler(admin_add_comment, lambda c: c.data.startswith('admin_comment_'))
-    dp.register_callback_query_handler(admin_send_message, lambda c: c.data.startswith('admin_message_'))
-    dp.register_callback_query_handler(back_to_orders, lambda c: c.data == 'admin_back_to_orders')
-    dp.register_callback_query_handler(confirm_broadcast_callback, lambda c: c.data in ['broadcast_confirm', 'broadcast_cancel'])
+    router.register(ADMIN_ORDER, admin_view_order)
+    router.register(ADMIN_STATUS, admin_change_status)
+    router.register(ADMIN_COMMENT, admin_add_comment)
+    router.register(ADMIN_MESSAGE, admin_send_message)
+    router.register(ADMIN_BACK_TO_ORDERS, back_to_orders)
+    router.register(ORDER_HISTORY, admin_order_history)
+    router.register(ORDERS_PAGE, admin_orders_page)
+    router.register(ORDERS_FILTER, admin_filter_orders)
+    router.register(BROADCAST_CONFIRM, confirm_broadcast_callback)
+    router.register(BROADCAST_CANCEL, cancel_broadcast_callback)
+    router.register(SEARCH_PAGE, search_page_callback)
+    router.register(USER_CARD, user_card_callback)
+    router.register(USER_ORDERS, user_orders_callback)
+    router.register(USER_ORDERS_PAGE, user_orders_page_callback)
@@ -1,7 +1,16 @@
 from aiogram import types, Dispatcher
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from database import Database
+from aiogram.utils.exceptions import MessageNotModified
+from database import AsyncDatabase
+from known_users import KnownUsers
+from callback_router import CallbackRouter
+from callback_data import (
+    VIEW_ORDER, WRITE_ORDER_MESSAGE, ORDER_STATUS, REVIEW_ORDER, RATE_ORDER, MY_ORDERS_PAGE, MY_ORDERS_FILTER,
+    REVIEW_ORDERS_PAGE
+)
+from notifications import NotificationQueue
+from utils import format_timestamp
 from keyboards import *
 from config import *
 
@@ -18,19 +27,15 @@ class ReviewForm(StatesGroup):
     waiting_for_comment = State()
 
 
-# Инициализация БД
-db = Database(DB_NAME)
-
-
 # Команда /start
-async def cmd_start(message: types.Message):
+async def cmd_start(message: types.Message, known_users: KnownUsers):
     user_id = message.from_user.id
     username = message.from_user.username or ""
     first_name = message.from_user.first_name or ""
     last_name = message.from_user.last_name or ""
 
-    # Регистрируем пользователя
-    db.add_user(user_id, username, first_name, last_name)
+    # Регистрируем пользователя (известных - без записи в БД)
+    await known_users.register(user_id, username, first_name, last_name)
 
     await message.answer(WELCOME_MESSAGE, reply_markup=main_menu())
 
@@ -96,7 +101,8 @@ async def start_order(message: types.Message):
 
 
 # Обработка текста заявки
-async def process_order_description(message: types.Message, state: FSMContext):
+async def process_order_description(message: types.Message, state: FSMContext, db: AsyncDatabase,
+                                    notifier: NotificationQueue):
     description = message.text
 
     if description == "🔙 Главное меню":
@@ -105,10 +111,8 @@ async def process_order_description(message: types.Message, state: FSMContext):
         return
 
     user_id = message.from_user.id
-    order_id = db.create_order(user_id, description)
-
-    # Сохраняем сообщение в историю
-    db.add_message(order_id, user_id, description, False)
+    # Заявка и первое сообщение истории записываются одной транзакцией
+    order_id = await db.create_order_with_message(user_id, description)
 
     await state.finish()
 
@@ -123,32 +127,34 @@ async def process_order_description(message: types.Message, state: FSMContext):
     await message.answer(success_text, reply_markup=main_menu())
 
     # Уведомление админу
-    try:
-        admin_notification = f"""
+    admin_notification = f"""
 🆕 Новая заявка #{order_id}!
 
 👤 От: {message.from_user.first_name}
 🆔 ID: {user_id}
 📝 Описание:
 {description}
-        """
-        from bot import bot
-        await bot.send_message(ADMIN_ID, admin_notification)
-    except:
-        pass
+    """
+    notifier.send(ADMIN_ID, admin_notification)
 
 
 # Личный кабинет
-async def show_cabinet(message: types.Message):
-    user = db.get_user(message.from_user.id)
-    orders = db.get_user_orders(message.from_user.id)
+async def show_cabinet(message: types.Message, db: AsyncDatabase, known_users: KnownUsers):
+    summary = await db.get_user_summary(message.from_user.id)
+
+    # Пользователь еще не зарегистрирован (не отправлял /start)
+    if not summary:
+        await cmd_start(message, known_users)
+        return
 
     cabinet_text = f"""
 👤 Личный кабинет
 
 📊 Ваша статистика:
-• Всего заявок: {len(orders)}
-• Дата регистрации: {user['registration_date']}
+• Всего заявок: {summary.total_orders}
+• В работе: {summary.new_orders + summary.in_progress}
+• Завершено: {summary.completed}
+• Дата регистрации: {format_timestamp(summary.registration_date)}
 
 Выберите действие:
     """
@@ -156,23 +162,70 @@ async def show_cabinet(message: types.Message):
     await message.answer(cabinet_text, reply_markup=cabinet_menu())
 
 
+# Счетчики сводки пользователя для фильтров "Мои заявки"
+MY_ORDERS_COUNTERS = {
+    'all': 'total_orders',
+    'new': 'new_orders',
+    'in_progress': 'in_progress',
+    'completed': 'completed',
+    'cancelled': 'cancelled'
+}
+
+
+# Текст и клавиатура страницы "Мои заявки"
+async def build_my_orders_page(db: AsyncDatabase, user_id: int, status_filter: str = "all",
+                               cursor: int = None, backward: bool = False):
+    summary = await db.get_user_summary(user_id)
+    total = getattr(summary, MY_ORDERS_COUNTERS[status_filter]) if summary else 0
+
+    status = None if status_filter == "all" else status_filter
+    page = await db.get_orders_page(status, cursor, backward, user_id=user_id)
+
+    if total:
+        text = f"📝 Ваши заявки (всего: {total}):"
+    else:
+        text = "📝 Заявок с таким статусом нет."
+
+    return total, text, user_orders_buttons(page, status_filter)
+
+
 # Показать мои заявки
-async def show_my_orders(message: types.Message):
-    orders = db.get_user_orders(message.from_user.id)
+async def show_my_orders(message: types.Message, db: AsyncDatabase):
+    total, text, keyboard = await build_my_orders_page(db, message.from_user.id)
 
-    if not orders:
+    if not total:
         await message.answer("У вас пока нет заявок.", reply_markup=cabinet_menu())
         return
 
-    text = "📝 Ваши заявки:\n\n"
+    await message.answer(text, reply_markup=keyboard)
+
 
-    await message.answer(text, reply_markup=user_orders_buttons(orders))
+# Фильтр "Мои заявки" по статусу
+async def my_orders_filter_callback(callback: types.CallbackQuery, status_filter: str, db: AsyncDatabase):
+    total, text, keyboard = await build_my_orders_page(db, callback.from_user.id, status_filter)
+
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except MessageNotModified:
+        # Повторное нажатие на текущий фильтр
+        pass
+    await callback.answer()
+
+
+# Переключение страниц "Мои заявки"
+async def my_orders_page_callback(callback: types.CallbackQuery, direction: str, cursor: int, status_filter: str,
+                                  db: AsyncDatabase):
+    total, text, keyboard = await build_my_orders_page(
+        db, callback.from_user.id, status_filter, cursor, direction == "prev"
+    )
+
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
 
 
 # Просмотр конкретной заявки
-async def view_order_callback(callback: types.CallbackQuery):
-    order_id = int(callback.data.split("_")[2])
-    order = db.get_order(order_id)
+async def view_order_callback(callback: types.CallbackQuery, order_id: int, db: AsyncDatabase):
+    order = await db.get_order(order_id)
 
     if not order:
         await callback.answer("Заявка не найдена", show_alert=True)
@@ -186,27 +239,25 @@ async def view_order_callback(callback: types.CallbackQuery):
     }
 
     order_text = f"""
-📋 Заявка #{order['order_id']}
+📋 Заявка #{order.order_id}
 
-📅 Создана: {order['created_at']}
-🔄 Обновлена: {order['updated_at']}
-📊 Статус: {status_text.get(order['status'], order['status'])}
+📅 Создана: {format_timestamp(order.created_at)}
+🔄 Обновлена: {format_timestamp(order.updated_at)}
+📊 Статус: {status_text.get(order.status, order.status)}
 
 📝 Описание:
-{order['description']}
+{order.description}
     """
 
-    if order['admin_comment']:
-        order_text += f"\n💬 Комментарий менеджера:\n{order['admin_comment']}"
+    if order.admin_comment:
+        order_text += f"\n💬 Комментарий менеджера:\n{order.admin_comment}"
 
     await callback.message.edit_text(order_text, reply_markup=order_inline_buttons(order_id))
     await callback.answer()
 
 
 # Написать сообщение по заявке
-async def message_order_callback(callback: types.CallbackQuery, state: FSMContext):
-    order_id = int(callback.data.split("_")[1])
-
+async def message_order_callback(callback: types.CallbackQuery, order_id: int, state: FSMContext):
     await state.update_data(order_id=order_id)
     await OrderForm.waiting_for_message.set()
 
@@ -215,7 +266,8 @@ async def message_order_callback(callback: types.CallbackQuery, state: FSMContex
 
 
 # Обработка сообщения по заявке
-async def process_order_message(message: types.Message, state: FSMContext):
+async def process_order_message(message: types.Message, state: FSMContext, db: AsyncDatabase,
+                                notifier: NotificationQueue):
     data = await state.get_data()
     order_id = data.get('order_id')
 
@@ -227,32 +279,26 @@ async def process_order_message(message: types.Message, state: FSMContext):
     message_text = message.text
 
     # Сохраняем сообщение
-    db.add_message(order_id, user_id, message_text, False)
+    await db.add_message(order_id, user_id, message_text, False)
 
     await state.finish()
 
     await message.answer("✅ Сообщение отправлено менеджеру!", reply_markup=cabinet_menu())
 
     # Уведомление админу
-    try:
-        order = db.get_order(order_id)
-        admin_notification = f"""
+    admin_notification = f"""
 💬 Новое сообщение по заявке #{order_id}
 
 👤 От: {message.from_user.first_name}
 📝 Сообщение:
 {message_text}
-        """
-        from bot import bot
-        await bot.send_message(ADMIN_ID, admin_notification)
-    except:
-        pass
+    """
+    notifier.send(ADMIN_ID, admin_notification)
 
 
 # Просмотр статуса заявки
-async def status_order_callback(callback: types.CallbackQuery):
-    order_id = int(callback.data.split("_")[1])
-    order = db.get_order(order_id)
+async def status_order_callback(callback: types.CallbackQuery, order_id: int, db: AsyncDatabase):
+    order = await db.get_order(order_id)
 
     if not order:
         await callback.answer("Заявка не найдена", show_alert=True)
@@ -265,39 +311,46 @@ async def status_order_callback(callback: types.CallbackQuery):
         'cancelled': '❌ Отменена'
     }
 
-    await callback.answer(status_text.get(order['status'], order['status']), show_alert=True)
+    await callback.answer(status_text.get(order.status, order.status), show_alert=True)
+
+
+# Сколько завершенных заказов показывать на одной странице выбора для отзыва
+REVIEW_ORDERS_PAGE_SIZE = 10
+
+
+# Страница выбора заказа для отзыва (курсор по завершенным заказам пользователя)
+async def build_review_page(db: AsyncDatabase, user_id: int, cursor: int = None, backward: bool = False):
+    page = await db.get_orders_page('completed', cursor, backward, REVIEW_ORDERS_PAGE_SIZE, user_id=user_id)
+    return "⭐ Выберите заказ для оценки:\n\n", review_orders_buttons(page)
 
 
 # Оставить отзыв
-async def start_review(message: types.Message):
-    orders = db.get_user_orders(message.from_user.id)
-    completed_orders = [o for o in orders if o['status'] == 'completed']
+async def start_review(message: types.Message, db: AsyncDatabase):
+    summary = await db.get_user_summary(message.from_user.id)
 
-    if not completed_orders:
+    if not summary or not summary.completed:
         await message.answer(
             "У вас нет завершенных заказов для оценки.",
             reply_markup=cabinet_menu()
         )
         return
 
-    text = "⭐ Выберите заказ для оценки:\n\n"
-    keyboard = InlineKeyboardMarkup(row_width=1)
-
-    for order in completed_orders:
-        keyboard.add(
-            InlineKeyboardButton(
-                f"Заказ #{order['order_id']}",
-                callback_data=f"review_{order['order_id']}"
-            )
-        )
+    text, keyboard = await build_review_page(db, message.from_user.id)
 
     await message.answer(text, reply_markup=keyboard)
 
 
-# Выбор заказа для отзыва
-async def select_order_for_review(callback: types.CallbackQuery, state: FSMContext):
-    order_id = int(callback.data.split("_")[1])
+# Переключение страниц выбора заказа для отзыва
+async def review_orders_page_callback(callback: types.CallbackQuery, direction: str, cursor: int,
+                                      db: AsyncDatabase):
+    text, keyboard = await build_review_page(db, callback.from_user.id, cursor, direction == "prev")
+
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
+
 
+# Выбор заказа для отзыва
+async def select_order_for_review(callback: types.CallbackQuery, order_id: int, state: FSMContext):
     await state.update_data(order_id=order_id)
 
     await callback.message.edit_text(
@@ -308,11 +361,7 @@ async def select_order_for_review(callback: types.CallbackQuery, state: FSMConte
 
 
 # Обработка оценки
-async def process_rating(callback: types.CallbackQuery, state: FSMContext):
-    data = callback.data.split("_")
-    order_id = int(data[1])
-    rating = int(data[2])
-
+async def process_rating(callback: types.CallbackQuery, order_id: int, rating: int, state: FSMContext):
     await state.update_data(order_id=order_id, rating=rating)
     await ReviewForm.waiting_for_comment.set()
 
@@ -324,14 +373,15 @@ async def process_rating(callback: types.CallbackQuery, state: FSMContext):
 
 
 # Обработка комментария к отзыву
-async def process_review_comment(message: types.Message, state: FSMContext):
+async def process_review_comment(message: types.Message, state: FSMContext, db: AsyncDatabase,
+                                 notifier: NotificationQueue):
     data = await state.get_data()
     order_id = data.get('order_id')
     rating = data.get('rating')
     comment = message.text
 
     # Сохраняем отзыв
-    db.add_review(message.from_user.id, order_id, rating, comment)
+    await db.add_review(message.from_user.id, order_id, rating, comment)
 
     await state.finish()
 
@@ -341,8 +391,7 @@ async def process_review_comment(message: types.Message, state: FSMContext):
     )
 
     # Уведомление админу
-    try:
-        admin_notification = f"""
+    admin_notification = f"""
 ⭐ Новый отзыв!
 
 📋 Заказ: #{order_id}
@@ -350,11 +399,8 @@ async def process_review_comment(message: types.Message, state: FSMContext):
 ⭐ Оценка: {rating}/5
 💬 Комментарий:
 {comment}
-        """
-        from bot import bot
-        await bot.send_message(ADMIN_ID, admin_notification)
-    except:
-        pass
+    """
+    notifier.send(ADMIN_ID, admin_notification)
 
 
 # Возврат в главное меню
@@ -364,7 +410,7 @@ async def back_to_main_menu(message: types.Message, state: FSMContext):
 
 
 # Регистрация обработчиков
-def register_user_handlers(dp: Dispatcher):
+def register_user_handlers(dp: Dispatcher, router: CallbackRouter):
     # Команды
     dp.register_message_handler(cmd_start, commands=['start', 'help'], state='*')
 
@@ -388,8 +434,11 @@ def register_user_handlers(dp: Dispatcher):
     dp.register_message_handler(process_review_comment, state=ReviewForm.waiting_for_comment)
 
     # Callback обработчики
-    dp.register_callback_query_handler(view_order_callback, lambda c: c.data.startswith('view_order_'))
-    dp.register_callback_query_handler(message_order_callback, lambda c: c.data.startswith('message_'))
-    dp.register_callback_query_handler(status_order_callback, lambda c: c.data.startswith('status_'))
-    dp.register_callback_query_handler(select_order_for_review, lambda c: c.data.startswith('review_'))
-    dp.register_callback_query_handler(process_rating, lambda c: c.data.startswith('rate_'))
+    router.register(VIEW_ORDER, view_order_callback)
+    router.register(WRITE_ORDER_MESSAGE, message_order_callback)
+    router.register(ORDER_STATUS, status_order_callback)
+    router.register(REVIEW_ORDER, select_order_for_review)
+    router.register(REVIEW_ORDERS_PAGE, review_orders_page_callback)
+    router.register(RATE_ORDER, process_rating)
+    router.register(MY_ORDERS_PAGE, my_orders_page_callback)
+    router.register(MY_ORDERS_FILTER, my_orders_filter_callback)
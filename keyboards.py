@@ -1,7 +1,40 @@
+from functools import lru_cache, wraps
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils import json
+
+from callback_data import (
+    VIEW_ORDER, WRITE_ORDER_MESSAGE, ORDER_STATUS, REVIEW_ORDER, RATE_ORDER, MY_ORDERS_PAGE, MY_ORDERS_FILTER,
+    REVIEW_ORDERS_PAGE,
+    ADMIN_ORDER, ADMIN_STATUS, ADMIN_MESSAGE, ADMIN_COMMENT, ADMIN_BACK_TO_ORDERS, ORDER_HISTORY,
+    ORDERS_PAGE, ORDERS_FILTER, BROADCAST_CONFIRM, BROADCAST_CANCEL, SEARCH_PAGE,
+    USER_CARD, USER_ORDERS, USER_ORDERS_PAGE
+)
+
+
+# Размер кэша клавиатур с параметрами (номер заявки, статус)
+KEYBOARD_CACHE_SIZE = 1024
+
+
+# Кэширование клавиатуры в виде готового JSON
+def cached_markup(maxsize: int = None):
+    """Клавиатура собирается один раз для каждого набора аргументов
+
+    Возвращается строка JSON: aiogram передает ее в запрос как есть, без
+    повторной сборки объектов и сериализации при каждом ответе.
+    maxsize=None - для статических клавиатур без аргументов.
+    """
+    def decorator(build):
+        @lru_cache(maxsize=maxsize)
+        @wraps(build)
+        def cached(*args) -> str:
+            return build(*args).as_json()
+        return cached
+    return decorator
 
 
 # Главное меню для пользователя
+@cached_markup()
 def main_menu():
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard.add(KeyboardButton("📋 Наши услуги"))
@@ -11,6 +44,7 @@ def main_menu():
 
 
 # Меню личного кабинета
+@cached_markup()
 def cabinet_menu():
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard.add(KeyboardButton("📝 Мои заявки"))
@@ -20,89 +54,164 @@ def cabinet_menu():
 
 
 # Inline кнопки для заявки (для пользователя)
+@cached_markup(KEYBOARD_CACHE_SIZE)
 def order_inline_buttons(order_id: int):
     keyboard = InlineKeyboardMarkup(row_width=2)
     keyboard.add(
-        InlineKeyboardButton("💬 Написать сообщение", callback_data=f"message_{order_id}"),
-        InlineKeyboardButton("📊 Статус", callback_data=f"status_{order_id}")
+        InlineKeyboardButton("💬 Написать сообщение", callback_data=WRITE_ORDER_MESSAGE.new(order_id)),
+        InlineKeyboardButton("📊 Статус", callback_data=ORDER_STATUS.new(order_id))
     )
     return keyboard
 
 
 # Админское главное меню
+@cached_markup()
 def admin_main_menu():
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard.add(KeyboardButton("📊 Статистика"))
     keyboard.add(KeyboardButton("📋 Все заявки"), KeyboardButton("🆕 Новые заявки"))
     keyboard.add(KeyboardButton("👥 Пользователи"), KeyboardButton("📢 Рассылка"))
+    keyboard.add(KeyboardButton("🔍 Поиск заявок"), KeyboardButton("🔎 Найти пользователя"))
     keyboard.add(KeyboardButton("👤 Пользовательский режим"))
     return keyboard
 
 
-# Inline кнопки для управления заявкой (для админа)
-def admin_order_buttons(order_id: int, current_status: str):
+# Кнопки статуса и действий заявки (для админа) в виде готовых строк клавиатуры
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def admin_order_rows(order_id: int, current_status: str) -> tuple:
     keyboard = InlineKeyboardMarkup(row_width=2)
 
     # Кнопки изменения статуса
     if current_status != "in_progress":
-        keyboard.add(InlineKeyboardButton("🔄 В работу", callback_data=f"admin_status_{order_id}_in_progress"))
+        keyboard.add(InlineKeyboardButton("🔄 В работу", callback_data=ADMIN_STATUS.new(order_id, "in_progress")))
 
     if current_status != "completed":
-        keyboard.add(InlineKeyboardButton("✅ Завершить", callback_data=f"admin_status_{order_id}_completed"))
+        keyboard.add(InlineKeyboardButton("✅ Завершить", callback_data=ADMIN_STATUS.new(order_id, "completed")))
 
     if current_status != "cancelled":
-        keyboard.add(InlineKeyboardButton("❌ Отменить", callback_data=f"admin_status_{order_id}_cancelled"))
+        keyboard.add(InlineKeyboardButton("❌ Отменить", callback_data=ADMIN_STATUS.new(order_id, "cancelled")))
 
     # Кнопки действий
     keyboard.add(
-        InlineKeyboardButton("💬 Написать клиенту", callback_data=f"admin_message_{order_id}"),
-        InlineKeyboardButton("📝 Комментарий", callback_data=f"admin_comment_{order_id}")
+        InlineKeyboardButton("💬 Написать клиенту", callback_data=ADMIN_MESSAGE.new(order_id)),
+        InlineKeyboardButton("📝 Комментарий", callback_data=ADMIN_COMMENT.new(order_id))
     )
-    keyboard.add(InlineKeyboardButton("🔙 Назад", callback_data="admin_back_to_orders"))
 
-    return keyboard
+    keyboard.add(InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_BACK_TO_ORDERS.new()))
 
+    return tuple(keyboard.to_python()['inline_keyboard'])
 
-# Inline кнопки для фильтрации заявок
-def admin_orders_filter():
-    keyboard = InlineKeyboardMarkup(row_width=2)
-    keyboard.add(
-        InlineKeyboardButton("🆕 Новые", callback_data="filter_new"),
-        InlineKeyboardButton("🔄 В работе", callback_data="filter_in_progress")
-    )
-    keyboard.add(
-        InlineKeyboardButton("✅ Завершенные", callback_data="filter_completed"),
-        InlineKeyboardButton("❌ Отмененные", callback_data="filter_cancelled")
-    )
-    keyboard.add(InlineKeyboardButton("📋 Все", callback_data="filter_all"))
+
+# Inline кнопки для управления заявкой (для админа)
+# Кэшируются строки по (order_id, status), курсор истории меняется с каждым
+# новым сообщением и добавляется при каждом вызове
+def admin_order_buttons(order_id: int, current_status: str, older_cursor: int = None) -> str:
+    rows = list(admin_order_rows(order_id, current_status))
+
+    # Курсор - самое раннее из показанных сообщений (строка перед "Назад")
+    if older_cursor is not None:
+        history = InlineKeyboardButton("⬆️ Ранние сообщения", callback_data=ORDER_HISTORY.new(order_id, older_cursor))
+        rows.insert(-1, [history.to_python()])
+
+    return json.dumps({'inline_keyboard': rows})
+
+
+# Inline кнопки для листания истории сообщений (для админа)
+def order_history_buttons(order_id: int, older_cursor: int = None):
+    keyboard = InlineKeyboardMarkup(row_width=1)
+
+    if older_cursor is not None:
+        keyboard.add(InlineKeyboardButton("⬆️ Еще раньше", callback_data=ORDER_HISTORY.new(order_id, older_cursor)))
+
+    keyboard.add(InlineKeyboardButton("🔙 К заявке", callback_data=ADMIN_ORDER.new(order_id)))
     return keyboard
 
 
-# Inline кнопки для списка заявок
-def admin_orders_list(orders: list, page: int = 0, per_page: int = 5):
+# Значки статусов заявок в списках
+STATUS_EMOJI = {
+    'new': '🆕',
+    'in_progress': '🔄',
+    'completed': '✅',
+    'cancelled': '❌'
+}
+
+
+# Кнопки "Назад"/"Вперед" для страницы заявок с курсором
+def _page_nav(keyboard: InlineKeyboardMarkup, page: dict, action, *args):
+    """Строка пагинации: курсором служит крайняя заявка текущей страницы
+
+    action - действие кнопки с аргументами (direction, cursor, *args).
+    """
+    orders = page['orders']
+    if not orders:
+        return
+
+    nav_buttons = []
+    if page['has_prev']:
+        nav_buttons.append(
+            InlineKeyboardButton("◀️ Назад", callback_data=action.new("prev", orders[0].order_id, *args))
+        )
+    if page['has_next']:
+        nav_buttons.append(
+            InlineKeyboardButton("Вперед ▶️", callback_data=action.new("next", orders[-1].order_id, *args))
+        )
+
+    if nav_buttons:
+        keyboard.row(*nav_buttons)
+
+
+# Кнопки фильтра списка заявок по статусу
+ORDER_FILTERS = [
+    ('all', '📋 Все'),
+    ('new', '🆕'),
+    ('in_progress', '🔄'),
+    ('completed', '✅'),
+    ('cancelled', '❌')
+]
+
+
+# Строка фильтра по статусу (текущий отмечен точкой)
+def order_filter_row(action, status_filter: str) -> list:
+    return [
+        InlineKeyboardButton(f"• {text}" if value == status_filter else text, callback_data=action.new(value))
+        for value, text in ORDER_FILTERS
+    ]
+
+
+# Inline кнопки для страницы списка заявок
+def admin_orders_list(page: dict, status_filter: str = "all"):
     keyboard = InlineKeyboardMarkup(row_width=1)
 
-    start = page * per_page
-    end = start + per_page
+    for order in page['orders']:
+        emoji = STATUS_EMOJI.get(order.status, '📋')
+
+        text = f"{emoji} Заявка #{order.order_id} от {order.first_name}"
+        keyboard.add(InlineKeyboardButton(text, callback_data=ADMIN_ORDER.new(order.order_id)))
+
+    _page_nav(keyboard, page, ORDERS_PAGE, status_filter)
+
+    keyboard.row(*order_filter_row(ORDERS_FILTER, status_filter))
+
+    return keyboard
+
+
+# Inline кнопки для страницы результатов поиска
+def search_results_buttons(hits: list, offset: int, page_size: int, has_more: bool):
+    keyboard = InlineKeyboardMarkup(row_width=1)
 
-    for order in orders[start:end]:
-        status_emoji = {
-            'new': '🆕',
-            'in_progress': '🔄',
-            'completed': '✅',
-            'cancelled': '❌'
-        }
-        emoji = status_emoji.get(order['status'], '📋')
+    for hit in hits:
+        emoji = STATUS_EMOJI.get(hit.status, '📋')
 
-        text = f"{emoji} Заявка #{order['order_id']} от {order['first_name']}"
-        keyboard.add(InlineKeyboardButton(text, callback_data=f"admin_order_{order['order_id']}"))
+        text = f"{emoji} Заявка #{hit.order_id} от {hit.first_name}"
+        keyboard.add(InlineKeyboardButton(text, callback_data=ADMIN_ORDER.new(hit.order_id)))
 
-    # Кнопки пагинации
     nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"page_{page-1}"))
-    if end < len(orders):
-        nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"page_{page+1}"))
+    if offset > 0:
+        nav_buttons.append(
+            InlineKeyboardButton("◀️ Назад", callback_data=SEARCH_PAGE.new(max(offset - page_size, 0)))
+        )
+    if has_more:
+        nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=SEARCH_PAGE.new(offset + page_size)))
 
     if nav_buttons:
         keyboard.row(*nav_buttons)
@@ -110,17 +219,54 @@ def admin_orders_list(orders: list, page: int = 0, per_page: int = 5):
     return keyboard
 
 
+# Inline кнопки для найденных пользователей
+def user_search_results(users: list):
+    keyboard = InlineKeyboardMarkup(row_width=1)
+
+    for user in users:
+        text = f"👤 {user.first_name}" + (f" (@{user.username})" if user.username else "")
+        keyboard.add(InlineKeyboardButton(text, callback_data=USER_CARD.new(user.user_id)))
+
+    return keyboard
+
+
+# Inline кнопки карточки пользователя (для админа)
+@cached_markup(KEYBOARD_CACHE_SIZE)
+def admin_user_card(user_id: int):
+    keyboard = InlineKeyboardMarkup(row_width=1)
+    keyboard.add(InlineKeyboardButton("📋 Заявки пользователя", callback_data=USER_ORDERS.new(user_id)))
+    return keyboard
+
+
+# Inline кнопки для страницы заявок одного пользователя (для админа)
+def admin_user_orders_list(page: dict, user_id: int):
+    keyboard = InlineKeyboardMarkup(row_width=1)
+
+    for order in page['orders']:
+        emoji = STATUS_EMOJI.get(order.status, '📋')
+
+        text = f"{emoji} Заявка #{order.order_id}"
+        keyboard.add(InlineKeyboardButton(text, callback_data=ADMIN_ORDER.new(order.order_id)))
+
+    _page_nav(keyboard, page, USER_ORDERS_PAGE, user_id)
+
+    keyboard.add(InlineKeyboardButton("🔙 К пользователю", callback_data=USER_CARD.new(user_id)))
+    return keyboard
+
+
 # Inline кнопки для подтверждения рассылки
+@cached_markup()
 def confirm_broadcast():
     keyboard = InlineKeyboardMarkup(row_width=2)
     keyboard.add(
-        InlineKeyboardButton("✅ Да, отправить", callback_data="broadcast_confirm"),
-        InlineKeyboardButton("❌ Отмена", callback_data="broadcast_cancel")
+        InlineKeyboardButton("✅ Да, отправить", callback_data=BROADCAST_CONFIRM.new()),
+        InlineKeyboardButton("❌ Отмена", callback_data=BROADCAST_CANCEL.new())
     )
     return keyboard
 
 
 # Кнопка возврата в главное меню
+@cached_markup()
 def back_to_main():
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard.add(KeyboardButton("🔙 Главное меню"))
@@ -128,29 +274,41 @@ def back_to_main():
 
 
 # Inline кнопки для оценки (звезды)
+@cached_markup(KEYBOARD_CACHE_SIZE)
 def rating_buttons(order_id: int):
     keyboard = InlineKeyboardMarkup(row_width=5)
     stars = []
     for i in range(1, 6):
-        stars.append(InlineKeyboardButton(f"{'⭐' * i}", callback_data=f"rate_{order_id}_{i}"))
+        stars.append(InlineKeyboardButton(f"{'⭐' * i}", callback_data=RATE_ORDER.new(order_id, i)))
     keyboard.row(*stars)
     return keyboard
 
 
-# Кнопки для списка заявок пользователя
-def user_orders_buttons(orders: list):
+# Кнопки для страницы списка заявок пользователя
+def user_orders_buttons(page: dict, status_filter: str = "all"):
     keyboard = InlineKeyboardMarkup(row_width=1)
 
-    status_emoji = {
-        'new': '🆕',
-        'in_progress': '🔄',
-        'completed': '✅',
-        'cancelled': '❌'
-    }
-
-    for order in orders:
-        emoji = status_emoji.get(order['status'], '📋')
-        text = f"{emoji} Заявка #{order['order_id']} - {order['status']}"
-        keyboard.add(InlineKeyboardButton(text, callback_data=f"view_order_{order['order_id']}"))
+    for order in page['orders']:
+        emoji = STATUS_EMOJI.get(order.status, '📋')
+        text = f"{emoji} Заявка #{order.order_id} - {order.status}"
+        keyboard.add(InlineKeyboardButton(text, callback_data=VIEW_ORDER.new(order.order_id)))
+
+    _page_nav(keyboard, page, MY_ORDERS_PAGE, status_filter)
+
+    keyboard.row(*order_filter_row(MY_ORDERS_FILTER, status_filter))
+
+    return keyboard
+
+
+# Кнопки выбора заказа для отзыва (страница завершенных заказов)
+def review_orders_buttons(page: dict):
+    keyboard = InlineKeyboardMarkup(row_width=1)
+
+    for order in page['orders']:
+        keyboard.add(
+            InlineKeyboardButton(f"Заказ #{order.order_id}", callback_data=REVIEW_ORDER.new(order.order_id))
+        )
+
+    _page_nav(keyboard, page, REVIEW_ORDERS_PAGE)
 
     return keyboard
@@ -0,0 +1,117 @@
+"""
+Кэш зарегистрированных пользователей
+
+/start и /help приходят часто, а регистрация нужна один раз. Для
+пользователей из кэша команда не пишет в БД; изменения имени и username
+копятся в памяти и записываются в БД пачками в фоне.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+
+from config import USER_CACHE_SIZE, USER_FLUSH_INTERVAL
+from database import AsyncDatabase
+
+
+logger = logging.getLogger(__name__)
+
+
+class KnownUsers:
+    """Ограниченный LRU-кэш профилей пользователей с отложенной записью"""
+
+    def __init__(self, db: AsyncDatabase,
+                 cache_size: int = USER_CACHE_SIZE,
+                 flush_interval: float = USER_FLUSH_INTERVAL):
+        self.db = db
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+
+        # user_id -> (username, first_name, last_name)
+        self._profiles = OrderedDict()
+        self._dirty = set()
+        self._worker = None
+
+    def _ensure_worker(self):
+        """Запуск фоновой записи при первом обращении"""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run_worker())
+
+    async def _run_worker(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._flush()
+            except Exception:
+                logger.exception("Ошибка записи профилей пользователей")
+
+    async def _flush(self):
+        """Запись изменившихся профилей в БД одной транзакцией"""
+        if not self._dirty:
+            return
+
+        user_ids, self._dirty = self._dirty, set()
+        profiles = [(user_id, *self._profiles[user_id]) for user_id in user_ids if user_id in self._profiles]
+
+        try:
+            await self.db.update_user_profiles(profiles)
+        except Exception:
+            # Не потерять изменения: повторим при следующей записи
+            self._dirty |= user_ids
+            raise
+
+        self._shrink()
+
+    def _shrink(self):
+        """Вытеснение давно не обращавшихся пользователей сверх лимита"""
+        excess = len(self._profiles) - self.cache_size
+        if excess <= 0:
+            return
+
+        # Несохраненные профили остаются до следующей записи в БД
+        evicted = []
+        for user_id in self._profiles:
+            if len(evicted) >= excess:
+                break
+            if user_id not in self._dirty:
+                evicted.append(user_id)
+
+        for user_id in evicted:
+            del self._profiles[user_id]
+
+    async def register(self, user_id: int, username: str, first_name: str, last_name: str):
+        """Регистрация нового пользователя или отложенное обновление профиля"""
+        self._ensure_worker()
+        profile = (username, first_name, last_name)
+
+        known = self._profiles.get(user_id)
+        if known is None:
+            # Нет в кэше: чтение дешевле записи, регистрируем только новых
+            user = await self.db.get_user(user_id)
+            if user is None:
+                await self.db.add_user(user_id, username, first_name, last_name)
+                known = profile
+            else:
+                known = (user.username, user.first_name, user.last_name)
+
+            # Пока шел запрос, профиль мог появиться в кэше
+            known = self._profiles.setdefault(user_id, known)
+
+        if known != profile:
+            self._profiles[user_id] = profile
+            self._dirty.add(user_id)
+
+        self._profiles.move_to_end(user_id)
+        self._shrink()
+
+    async def close(self):
+        """Остановка фоновой задачи и запись всех изменений"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        await self._flush()
@@ -0,0 +1,22 @@
+"""
+Middleware бота
+"""
+
+from aiogram.dispatcher.middlewares import LifetimeControllerMiddleware
+
+
+class DependencyMiddleware(LifetimeControllerMiddleware):
+    """Передача общих объектов приложения (БД, сервисов) в обработчики
+
+    Обработчик получает объект, если объявит аргумент с тем же именем,
+    например: async def show_cabinet(message: types.Message, db: AsyncDatabase)
+    """
+
+    skip_patterns = ["update", "error"]
+
+    def __init__(self, **dependencies):
+        super().__init__()
+        self.dependencies = dependencies
+
+    async def pre_process(self, obj, data, *args):
+        data.update(self.dependencies)
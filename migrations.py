@@ -0,0 +1,604 @@
+"""
+Миграции схемы базы данных
+
+Номер миграции совпадает со значением PRAGMA user_version после ее применения.
+Новые миграции добавляются только в конец списка.
+"""
+
+MIGRATIONS = [
+    # 1: Исходные таблицы
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        registration_date TEXT,
+        is_blocked INTEGER DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS orders (
+        order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        description TEXT,
+        status TEXT DEFAULT 'new',
+        created_at TEXT,
+        updated_at TEXT,
+        admin_comment TEXT,
+        budget TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS messages (
+        message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER,
+        user_id INTEGER,
+        message_text TEXT,
+        is_from_admin INTEGER DEFAULT 0,
+        created_at TEXT,
+        FOREIGN KEY (order_id) REFERENCES orders (order_id),
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS reviews (
+        review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        order_id INTEGER,
+        rating INTEGER,
+        comment TEXT,
+        created_at TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        FOREIGN KEY (order_id) REFERENCES orders (order_id)
+    );
+    """,
+
+    # 2: Индексы для списков заявок и истории сообщений
+    """
+    CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+    CREATE INDEX IF NOT EXISTS idx_messages_order_created ON messages (order_id, created_at);
+    """,
+
+    # 3: Счетчики статистики, поддерживаемые триггерами
+    """
+    CREATE TABLE statistics (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_users INTEGER NOT NULL DEFAULT 0,
+        total_orders INTEGER NOT NULL DEFAULT 0,
+        new_orders INTEGER NOT NULL DEFAULT 0,
+        in_progress INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        cancelled INTEGER NOT NULL DEFAULT 0,
+        review_count INTEGER NOT NULL DEFAULT 0,
+        rating_sum INTEGER NOT NULL DEFAULT 0
+    );
+
+    INSERT INTO statistics (id, total_users, total_orders, new_orders, in_progress,
+                            completed, cancelled, review_count, rating_sum)
+    SELECT 1,
+           (SELECT COUNT(*) FROM users),
+           (SELECT COUNT(*) FROM orders),
+           (SELECT COUNT(*) FROM orders WHERE status = 'new'),
+           (SELECT COUNT(*) FROM orders WHERE status = 'in_progress'),
+           (SELECT COUNT(*) FROM orders WHERE status = 'completed'),
+           (SELECT COUNT(*) FROM orders WHERE status = 'cancelled'),
+           (SELECT COUNT(*) FROM reviews),
+           (SELECT COALESCE(SUM(rating), 0) FROM reviews);
+
+    CREATE TRIGGER statistics_users_insert AFTER INSERT ON users BEGIN
+        UPDATE statistics SET total_users = total_users + 1 WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_users_delete AFTER DELETE ON users BEGIN
+        UPDATE statistics SET total_users = total_users - 1 WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_orders_insert AFTER INSERT ON orders BEGIN
+        UPDATE statistics SET
+            total_orders = total_orders + 1,
+            new_orders = new_orders + (NEW.status = 'new'),
+            in_progress = in_progress + (NEW.status = 'in_progress'),
+            completed = completed + (NEW.status = 'completed'),
+            cancelled = cancelled + (NEW.status = 'cancelled')
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_orders_delete AFTER DELETE ON orders BEGIN
+        UPDATE statistics SET
+            total_orders = total_orders - 1,
+            new_orders = new_orders - (OLD.status = 'new'),
+            in_progress = in_progress - (OLD.status = 'in_progress'),
+            completed = completed - (OLD.status = 'completed'),
+            cancelled = cancelled - (OLD.status = 'cancelled')
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_orders_status AFTER UPDATE OF status ON orders
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        UPDATE statistics SET
+            new_orders = new_orders - (OLD.status = 'new') + (NEW.status = 'new'),
+            in_progress = in_progress - (OLD.status = 'in_progress') + (NEW.status = 'in_progress'),
+            completed = completed - (OLD.status = 'completed') + (NEW.status = 'completed'),
+            cancelled = cancelled - (OLD.status = 'cancelled') + (NEW.status = 'cancelled')
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_reviews_insert AFTER INSERT ON reviews BEGIN
+        UPDATE statistics SET
+            review_count = review_count + 1,
+            rating_sum = rating_sum + COALESCE(NEW.rating, 0)
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_reviews_delete AFTER DELETE ON reviews BEGIN
+        UPDATE statistics SET
+            review_count = review_count - 1,
+            rating_sum = rating_sum - COALESCE(OLD.rating, 0)
+        WHERE id = 1;
+    END;
+    """,
+
+    # 4: Задания рассылки и результаты отправки по пользователям
+    """
+    CREATE TABLE broadcasts (
+        broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running',
+        cursor INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        chat_id INTEGER,
+        message_id INTEGER,
+        created_at TEXT,
+        finished_at TEXT
+    );
+
+    CREATE INDEX idx_broadcasts_status ON broadcasts (status);
+
+    CREATE TABLE broadcast_results (
+        broadcast_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        is_sent INTEGER NOT NULL,
+        error TEXT,
+        PRIMARY KEY (broadcast_id, user_id)
+    ) WITHOUT ROWID;
+    """,
+
+    # 5: Индекс для списка последних пользователей
+    """
+    CREATE INDEX idx_users_registration ON users (registration_date);
+    """,
+
+    # 6: Состояния FSM (updated_at - unix-время последнего изменения)
+    """
+    CREATE TABLE fsm_states (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        state TEXT,
+        data TEXT NOT NULL DEFAULT '{}',
+        updated_at INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, user_id)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX idx_fsm_states_updated ON fsm_states (updated_at);
+    """,
+
+    # 7: Недоставленные уведомления
+    """
+    CREATE TABLE failed_notifications (
+        notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        error TEXT,
+        attempts INTEGER NOT NULL,
+        created_at TEXT
+    );
+    """,
+
+    # 8: Порядок сообщений заявки по message_id (выборка последних N без сортировки)
+    """
+    DROP INDEX IF EXISTS idx_messages_order_created;
+    CREATE INDEX idx_messages_order_message ON messages (order_id, message_id);
+    """,
+
+    # 9: Сводка заявок по каждому пользователю, поддерживаемая триггерами
+    """
+    CREATE TABLE user_order_stats (
+        user_id INTEGER PRIMARY KEY,
+        total_orders INTEGER NOT NULL DEFAULT 0,
+        new_orders INTEGER NOT NULL DEFAULT 0,
+        in_progress INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        cancelled INTEGER NOT NULL DEFAULT 0,
+        last_order_at TEXT
+    ) WITHOUT ROWID;
+
+    INSERT INTO user_order_stats (user_id, total_orders, new_orders, in_progress,
+                                  completed, cancelled, last_order_at)
+    SELECT user_id,
+           COUNT(*),
+           SUM(status = 'new'),
+           SUM(status = 'in_progress'),
+           SUM(status = 'completed'),
+           SUM(status = 'cancelled'),
+           MAX(created_at)
+    FROM orders
+    GROUP BY user_id;
+
+    CREATE TRIGGER user_order_stats_insert AFTER INSERT ON orders BEGIN
+        INSERT INTO user_order_stats (user_id, total_orders, new_orders, in_progress,
+                                      completed, cancelled, last_order_at)
+        VALUES (NEW.user_id, 1, NEW.status = 'new', NEW.status = 'in_progress',
+                NEW.status = 'completed', NEW.status = 'cancelled', NEW.created_at)
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_orders = total_orders + 1,
+            new_orders = new_orders + excluded.new_orders,
+            in_progress = in_progress + excluded.in_progress,
+            completed = completed + excluded.completed,
+            cancelled = cancelled + excluded.cancelled,
+            last_order_at = MAX(COALESCE(last_order_at, ''), excluded.last_order_at);
+    END;
+
+    CREATE TRIGGER user_order_stats_delete AFTER DELETE ON orders BEGIN
+        UPDATE user_order_stats SET
+            total_orders = total_orders - 1,
+            new_orders = new_orders - (OLD.status = 'new'),
+            in_progress = in_progress - (OLD.status = 'in_progress'),
+            completed = completed - (OLD.status = 'completed'),
+            cancelled = cancelled - (OLD.status = 'cancelled'),
+            last_order_at = (SELECT MAX(created_at) FROM orders WHERE user_id = OLD.user_id)
+        WHERE user_id = OLD.user_id;
+    END;
+
+    CREATE TRIGGER user_order_stats_status AFTER UPDATE OF status ON orders
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        UPDATE user_order_stats SET
+            new_orders = new_orders - (OLD.status = 'new') + (NEW.status = 'new'),
+            in_progress = in_progress - (OLD.status = 'in_progress') + (NEW.status = 'in_progress'),
+            completed = completed - (OLD.status = 'completed') + (NEW.status = 'completed'),
+            cancelled = cancelled - (OLD.status = 'cancelled') + (NEW.status = 'cancelled')
+        WHERE user_id = NEW.user_id;
+    END;
+
+    CREATE INDEX idx_orders_user_status_created ON orders (user_id, status, created_at);
+    """,
+
+    # 10: Даты - unix-время (секунды) в INTEGER вместо текста "YYYY-MM-DD HH:MM:SS"
+    # SQLite не меняет тип колонки, поэтому таблицы пересоздаются; старые даты
+    # записаны в местном времени, модификатор 'utc' переводит их в UTC.
+    # Вместе с таблицами удаляются их индексы и триггеры - они создаются заново,
+    # счетчик AUTOINCREMENT переносится, чтобы номера удаленных строк не повторялись.
+    """
+    CREATE TABLE users_new (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        registration_date INTEGER,
+        is_blocked INTEGER DEFAULT 0
+    );
+
+    INSERT INTO users_new (user_id, username, first_name, last_name, registration_date, is_blocked)
+    SELECT user_id, username, first_name, last_name,
+           CAST(strftime('%s', registration_date, 'utc') AS INTEGER), is_blocked
+    FROM users;
+
+    DROP TABLE users;
+    ALTER TABLE users_new RENAME TO users;
+
+    CREATE TABLE orders_new (
+        order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        description TEXT,
+        status TEXT DEFAULT 'new',
+        created_at INTEGER,
+        updated_at INTEGER,
+        admin_comment TEXT,
+        budget TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+
+    INSERT INTO orders_new (order_id, user_id, description, status, created_at, updated_at, admin_comment, budget)
+    SELECT order_id, user_id, description, status,
+           CAST(strftime('%s', created_at, 'utc') AS INTEGER),
+           CAST(strftime('%s', updated_at, 'utc') AS INTEGER),
+           admin_comment, budget
+    FROM orders;
+
+    DELETE FROM sqlite_sequence WHERE name = 'orders_new';
+    UPDATE sqlite_sequence SET name = 'orders_new' WHERE name = 'orders';
+    DROP TABLE orders;
+    ALTER TABLE orders_new RENAME TO orders;
+
+    CREATE TABLE messages_new (
+        message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER,
+        user_id INTEGER,
+        message_text TEXT,
+        is_from_admin INTEGER DEFAULT 0,
+        created_at INTEGER,
+        FOREIGN KEY (order_id) REFERENCES orders (order_id),
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+
+    INSERT INTO messages_new (message_id, order_id, user_id, message_text, is_from_admin, created_at)
+    SELECT message_id, order_id, user_id, message_text, is_from_admin,
+           CAST(strftime('%s', created_at, 'utc') AS INTEGER)
+    FROM messages;
+
+    DELETE FROM sqlite_sequence WHERE name = 'messages_new';
+    UPDATE sqlite_sequence SET name = 'messages_new' WHERE name = 'messages';
+    DROP TABLE messages;
+    ALTER TABLE messages_new RENAME TO messages;
+
+    CREATE TABLE reviews_new (
+        review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        order_id INTEGER,
+        rating INTEGER,
+        comment TEXT,
+        created_at INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        FOREIGN KEY (order_id) REFERENCES orders (order_id)
+    );
+
+    INSERT INTO reviews_new (review_id, user_id, order_id, rating, comment, created_at)
+    SELECT review_id, user_id, order_id, rating, comment,
+           CAST(strftime('%s', created_at, 'utc') AS INTEGER)
+    FROM reviews;
+
+    DELETE FROM sqlite_sequence WHERE name = 'reviews_new';
+    UPDATE sqlite_sequence SET name = 'reviews_new' WHERE name = 'reviews';
+    DROP TABLE reviews;
+    ALTER TABLE reviews_new RENAME TO reviews;
+
+    CREATE TABLE broadcasts_new (
+        broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running',
+        cursor INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        chat_id INTEGER,
+        message_id INTEGER,
+        created_at INTEGER,
+        finished_at INTEGER
+    );
+
+    INSERT INTO broadcasts_new (broadcast_id, text, status, cursor, total, sent, failed,
+                                chat_id, message_id, created_at, finished_at)
+    SELECT broadcast_id, text, status, cursor, total, sent, failed, chat_id, message_id,
+           CAST(strftime('%s', created_at, 'utc') AS INTEGER),
+           CAST(strftime('%s', finished_at, 'utc') AS INTEGER)
+    FROM broadcasts;
+
+    DELETE FROM sqlite_sequence WHERE name = 'broadcasts_new';
+    UPDATE sqlite_sequence SET name = 'broadcasts_new' WHERE name = 'broadcasts';
+    DROP TABLE broadcasts;
+    ALTER TABLE broadcasts_new RENAME TO broadcasts;
+
+    CREATE TABLE failed_notifications_new (
+        notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        error TEXT,
+        attempts INTEGER NOT NULL,
+        created_at INTEGER
+    );
+
+    INSERT INTO failed_notifications_new (notification_id, chat_id, text, error, attempts, created_at)
+    SELECT notification_id, chat_id, text, error, attempts,
+           CAST(strftime('%s', created_at, 'utc') AS INTEGER)
+    FROM failed_notifications;
+
+    DELETE FROM sqlite_sequence WHERE name = 'failed_notifications_new';
+    UPDATE sqlite_sequence SET name = 'failed_notifications_new' WHERE name = 'failed_notifications';
+    DROP TABLE failed_notifications;
+    ALTER TABLE failed_notifications_new RENAME TO failed_notifications;
+
+    DROP TABLE user_order_stats;
+
+    CREATE TABLE user_order_stats (
+        user_id INTEGER PRIMARY KEY,
+        total_orders INTEGER NOT NULL DEFAULT 0,
+        new_orders INTEGER NOT NULL DEFAULT 0,
+        in_progress INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        cancelled INTEGER NOT NULL DEFAULT 0,
+        last_order_at INTEGER
+    ) WITHOUT ROWID;
+
+    INSERT INTO user_order_stats (user_id, total_orders, new_orders, in_progress,
+                                  completed, cancelled, last_order_at)
+    SELECT user_id,
+           COUNT(*),
+           SUM(status = 'new'),
+           SUM(status = 'in_progress'),
+           SUM(status = 'completed'),
+           SUM(status = 'cancelled'),
+           MAX(created_at)
+    FROM orders
+    GROUP BY user_id;
+
+    CREATE INDEX idx_users_registration ON users (registration_date);
+    CREATE INDEX idx_orders_user_created ON orders (user_id, created_at);
+    CREATE INDEX idx_orders_status_created ON orders (status, created_at);
+    CREATE INDEX idx_orders_created ON orders (created_at);
+    CREATE INDEX idx_orders_user_status_created ON orders (user_id, status, created_at);
+    CREATE INDEX idx_messages_order_message ON messages (order_id, message_id);
+    CREATE INDEX idx_broadcasts_status ON broadcasts (status);
+
+    CREATE TRIGGER statistics_users_insert AFTER INSERT ON users BEGIN
+        UPDATE statistics SET total_users = total_users + 1 WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_users_delete AFTER DELETE ON users BEGIN
+        UPDATE statistics SET total_users = total_users - 1 WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_orders_insert AFTER INSERT ON orders BEGIN
+        UPDATE statistics SET
+            total_orders = total_orders + 1,
+            new_orders = new_orders + (NEW.status = 'new'),
+            in_progress = in_progress + (NEW.status = 'in_progress'),
+            completed = completed + (NEW.status = 'completed'),
+            cancelled = cancelled + (NEW.status = 'cancelled')
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_orders_delete AFTER DELETE ON orders BEGIN
+        UPDATE statistics SET
+            total_orders = total_orders - 1,
+            new_orders = new_orders - (OLD.status = 'new'),
+            in_progress = in_progress - (OLD.status = 'in_progress'),
+            completed = completed - (OLD.status = 'completed'),
+            cancelled = cancelled - (OLD.status = 'cancelled')
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_orders_status AFTER UPDATE OF status ON orders
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        UPDATE statistics SET
+            new_orders = new_orders - (OLD.status = 'new') + (NEW.status = 'new'),
+            in_progress = in_progress - (OLD.status = 'in_progress') + (NEW.status = 'in_progress'),
+            completed = completed - (OLD.status = 'completed') + (NEW.status = 'completed'),
+            cancelled = cancelled - (OLD.status = 'cancelled') + (NEW.status = 'cancelled')
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_reviews_insert AFTER INSERT ON reviews BEGIN
+        UPDATE statistics SET
+            review_count = review_count + 1,
+            rating_sum = rating_sum + COALESCE(NEW.rating, 0)
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER statistics_reviews_delete AFTER DELETE ON reviews BEGIN
+        UPDATE statistics SET
+            review_count = review_count - 1,
+            rating_sum = rating_sum - COALESCE(OLD.rating, 0)
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER user_order_stats_insert AFTER INSERT ON orders BEGIN
+        INSERT INTO user_order_stats (user_id, total_orders, new_orders, in_progress,
+                                      completed, cancelled, last_order_at)
+        VALUES (NEW.user_id, 1, NEW.status = 'new', NEW.status = 'in_progress',
+                NEW.status = 'completed', NEW.status = 'cancelled', NEW.created_at)
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_orders = total_orders + 1,
+            new_orders = new_orders + excluded.new_orders,
+            in_progress = in_progress + excluded.in_progress,
+            completed = completed + excluded.completed,
+            cancelled = cancelled + excluded.cancelled,
+            last_order_at = MAX(COALESCE(last_order_at, 0), excluded.last_order_at);
+    END;
+
+    CREATE TRIGGER user_order_stats_delete AFTER DELETE ON orders BEGIN
+        UPDATE user_order_stats SET
+            total_orders = total_orders - 1,
+            new_orders = new_orders - (OLD.status = 'new'),
+            in_progress = in_progress - (OLD.status = 'in_progress'),
+            completed = completed - (OLD.status = 'completed'),
+            cancelled = cancelled - (OLD.status = 'cancelled'),
+            last_order_at = (SELECT MAX(created_at) FROM orders WHERE user_id = OLD.user_id)
+        WHERE user_id = OLD.user_id;
+    END;
+
+    CREATE TRIGGER user_order_stats_status AFTER UPDATE OF status ON orders
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        UPDATE user_order_stats SET
+            new_orders = new_orders - (OLD.status = 'new') + (NEW.status = 'new'),
+            in_progress = in_progress - (OLD.status = 'in_progress') + (NEW.status = 'in_progress'),
+            completed = completed - (OLD.status = 'completed') + (NEW.status = 'completed'),
+            cancelled = cancelled - (OLD.status = 'cancelled') + (NEW.status = 'cancelled')
+        WHERE user_id = NEW.user_id;
+    END;
+    """,
+
+    # 11: Полнотекстовый поиск (FTS5) по описанию и комментарию заявок и по переписке
+    # Индексы хранят только слова (content= ссылается на исходные таблицы),
+    # их синхронизируют триггеры. unicode61 приводит к нижнему регистру и
+    # кириллицу; prefix ускоряет поиск по началу слова.
+    """
+    CREATE VIRTUAL TABLE orders_fts USING fts5(
+        description,
+        admin_comment,
+        content = 'orders',
+        content_rowid = 'order_id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    );
+
+    CREATE VIRTUAL TABLE messages_fts USING fts5(
+        message_text,
+        content = 'messages',
+        content_rowid = 'message_id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    );
+
+    INSERT INTO orders_fts (orders_fts) VALUES ('rebuild');
+    INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');
+
+    -- Совпадение в описании весит вдвое больше, чем в комментарии
+    INSERT INTO orders_fts (orders_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0)');
+
+    CREATE TRIGGER orders_fts_insert AFTER INSERT ON orders BEGIN
+        INSERT INTO orders_fts (rowid, description, admin_comment)
+        VALUES (NEW.order_id, NEW.description, NEW.admin_comment);
+    END;
+
+    CREATE TRIGGER orders_fts_delete AFTER DELETE ON orders BEGIN
+        INSERT INTO orders_fts (orders_fts, rowid, description, admin_comment)
+        VALUES ('delete', OLD.order_id, OLD.description, OLD.admin_comment);
+    END;
+
+    CREATE TRIGGER orders_fts_update AFTER UPDATE OF description, admin_comment ON orders
+    WHEN OLD.description IS NOT NEW.description OR OLD.admin_comment IS NOT NEW.admin_comment BEGIN
+        INSERT INTO orders_fts (orders_fts, rowid, description, admin_comment)
+        VALUES ('delete', OLD.order_id, OLD.description, OLD.admin_comment);
+        INSERT INTO orders_fts (rowid, description, admin_comment)
+        VALUES (NEW.order_id, NEW.description, NEW.admin_comment);
+    END;
+
+    CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, message_text) VALUES (NEW.message_id, NEW.message_text);
+    END;
+
+    CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, message_text)
+        VALUES ('delete', OLD.message_id, OLD.message_text);
+    END;
+
+    CREATE TRIGGER messages_fts_update AFTER UPDATE OF message_text ON messages
+    WHEN OLD.message_text IS NOT NEW.message_text BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, message_text)
+        VALUES ('delete', OLD.message_id, OLD.message_text);
+        INSERT INTO messages_fts (rowid, message_text) VALUES (NEW.message_id, NEW.message_text);
+    END;
+    """,
+
+    # 12: Поиск пользователей по началу username и имени без учета регистра
+    # lower() в SQLite меняет регистр только латиницы, поэтому рядом хранятся
+    # значения после str.casefold() (функция casefold регистрируется в Database,
+    # при записи значения вычисляются в Python).
+    """
+    ALTER TABLE users ADD COLUMN username_search TEXT;
+    ALTER TABLE users ADD COLUMN first_name_search TEXT;
+
+    UPDATE users SET
+        username_search = casefold(username),
+        first_name_search = casefold(first_name);
+
+    CREATE INDEX idx_users_username_search ON users (username_search);
+    CREATE INDEX idx_users_first_name_search ON users (first_name_search);
+    """,
+]
+
+
+# Текущая версия схемы
+SCHEMA_VERSION = len(MIGRATIONS)
@@ -0,0 +1,101 @@
+"""
+Записи, которые возвращает Database
+
+Записи - именованные кортежи: поля проверяются в одном месте, на строку
+не создается словарь с ключами, а кэш заявок может отдавать одну и ту же
+неизменяемую запись без копирования. Поля читаются как атрибуты:
+order.status, user.first_name.
+
+COLUMNS - столбцы SELECT в порядке полей записи (с псевдонимами таблиц
+из запросов Database), запись создается из строки через Model._make(row).
+"""
+
+from typing import NamedTuple, Optional
+
+
+class User(NamedTuple):
+    """Пользователь бота"""
+    user_id: int
+    username: str
+    first_name: str
+    last_name: str
+    registration_date: Optional[int]
+    is_blocked: int
+
+    COLUMNS = "u.user_id, u.username, u.first_name, u.last_name, u.registration_date, u.is_blocked"
+
+
+class UserSummary(NamedTuple):
+    """Пользователь и счетчики его заявок по статусам"""
+    user_id: int
+    username: str
+    first_name: str
+    registration_date: Optional[int]
+    total_orders: int
+    new_orders: int
+    in_progress: int
+    completed: int
+    cancelled: int
+    last_order_at: Optional[int]
+
+    COLUMNS = """
+        u.user_id, u.username, u.first_name, u.registration_date,
+        COALESCE(s.total_orders, 0), COALESCE(s.new_orders, 0),
+        COALESCE(s.in_progress, 0), COALESCE(s.completed, 0),
+        COALESCE(s.cancelled, 0), s.last_order_at
+    """
+
+
+class Order(NamedTuple):
+    """Заявка вместе с именем клиента"""
+    order_id: int
+    user_id: int
+    description: str
+    status: str
+    created_at: Optional[int]
+    updated_at: Optional[int]
+    admin_comment: Optional[str]
+    budget: Optional[str]
+    username: str
+    first_name: str
+    last_name: str
+
+    COLUMNS = """
+        o.order_id, o.user_id, o.description, o.status, o.created_at,
+        o.updated_at, o.admin_comment, o.budget,
+        u.username, u.first_name, u.last_name
+    """
+
+
+class Message(NamedTuple):
+    """Сообщение в переписке по заявке"""
+    message_id: int
+    order_id: int
+    user_id: int
+    message_text: str
+    is_from_admin: int
+    created_at: Optional[int]
+
+    COLUMNS = "m.message_id, m.order_id, m.user_id, m.message_text, m.is_from_admin, m.created_at"
+
+
+class OrderHit(NamedTuple):
+    """Заявка в результатах полнотекстового поиска
+
+    snippet - фрагмент текста вокруг совпадения, найденные слова отмечены
+    SNIPPET_START/SNIPPET_END (см. utils.format_snippet). Фрагмент строится
+    по тексту совпадения (database.make_snippet), поэтому в COLUMNS его нет.
+    """
+    order_id: int
+    user_id: int
+    status: str
+    created_at: Optional[int]
+    first_name: str
+    snippet: str
+
+    COLUMNS = "o.order_id, o.user_id, o.status, o.created_at, u.first_name"
+
+
+# Отметки найденных слов в snippet (управляющие символы не встречаются в тексте сообщений)
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
@@ -0,0 +1,84 @@
+"""
+Очередь исходящих уведомлений
+
+Обработчики ставят уведомление в очередь и сразу отвечают пользователю,
+отправку выполняют фоновые воркеры. Все сообщения одного чата попадают
+к одному воркеру и доставляются по порядку. Уведомления, которые не
+удалось доставить, сохраняются в таблицу failed_notifications.
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+
+from aiogram import Bot
+
+from config import NOTIFY_WORKERS, NOTIFY_MAX_ATTEMPTS, NOTIFY_RETRY_DELAY
+from database import AsyncDatabase
+from delivery import send_with_retry
+
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationQueue:
+    """Фоновая отправка уведомлений с повторами"""
+
+    def __init__(self, workers: int = NOTIFY_WORKERS,
+                 max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+                 retry_delay: float = NOTIFY_RETRY_DELAY):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self.bot: Optional[Bot] = None
+        self.db: Optional[AsyncDatabase] = None
+        # Очереди создаются сразу: уведомления, поставленные до start(), отправятся после запуска
+        self._queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(self.workers)]
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, bot: Bot, db: AsyncDatabase):
+        """Запуск воркеров"""
+        self.bot = bot
+        self.db = db
+        self._tasks = [asyncio.create_task(self._run_worker(queue)) for queue in self._queues]
+
+    async def stop(self, timeout: float = 10):
+        """Отправка оставшихся уведомлений и остановка воркеров"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не все уведомления отправлены до остановки бота")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def send(self, chat_id: int, text: str, **kwargs):
+        """Постановка уведомления в очередь (без ожидания отправки)"""
+        if not self._tasks:
+            logger.warning(f"Очередь уведомлений не запущена, уведомление в чат {chat_id} ждет запуска")
+
+        queue = self._queues[chat_id % len(self._queues)]
+        queue.put_nowait((chat_id, text, kwargs))
+
+    async def _run_worker(self, queue: asyncio.Queue):
+        while True:
+            chat_id, text, kwargs = await queue.get()
+            try:
+                await self._deliver(chat_id, text, kwargs)
+            except Exception:
+                logger.exception(f"Ошибка отправки уведомления в чат {chat_id}")
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, chat_id: int, text: str, kwargs: dict):
+        sent, error, attempts = await send_with_retry(
+            self.bot, chat_id, text, self.max_attempts, self.retry_delay, **kwargs
+        )
+        if sent:
+            return
+
+        logger.warning(f"Уведомление в чат {chat_id} не доставлено: {error}")
+        await self.db.add_failed_notification(chat_id, text, error, attempts)
@@ -0,0 +1,21 @@
+"""
+Вспомогательные функции для вывода данных пользователю
+"""
+
+import datetime
+import html
+from typing import Optional
+
+from models import SNIPPET_START, SNIPPET_END
+
+
+def format_timestamp(timestamp: Optional[int]) -> str:
+    """Дата из unix-времени (в БД) в местном времени: YYYY-MM-DD HH:MM:SS"""
+    if timestamp is None:
+        return "—"
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_snippet(snippet: str) -> str:
+    """Фрагмент из результатов поиска в HTML: текст экранируется, найденные слова - жирным"""
+    return html.escape(snippet).replace(SNIPPET_START, "<b>").replace(SNIPPET_END, "</b>")
@@ -0,0 +1,60 @@
+"""
+Режим webhook: прием обновлений от Telegram через веб-сервер aiohttp
+"""
+
+import hmac
+import logging
+
+from aiohttp import web
+from aiogram import Dispatcher
+from aiogram.dispatcher.webhook import WebhookRequestHandler
+from aiogram.utils.executor import Executor
+
+from config import WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT, HEALTH_PATH
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class SecretTokenRequestHandler(WebhookRequestHandler):
+    """Обработчик webhook, принимающий только запросы с секретным токеном"""
+
+    async def post(self):
+        token = self.request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            logger.warning(f"Отклонен запрос к webhook без верного токена от {self.request.remote}")
+            raise web.HTTPForbidden()
+
+        return await super().post()
+
+
+# Проверка работоспособности (для балансировщика и мониторинга)
+async def health(request: web.Request):
+    return web.json_response({'status': 'ok'})
+
+
+def start_webhook(dp: Dispatcher, on_startup, on_shutdown):
+    """Запуск веб-сервера webhook с общими обработчиками запуска и остановки"""
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("Для режима webhook необходимо указать WEBHOOK_SECRET в config.py")
+
+    async def startup(dp: Dispatcher):
+        if WEBHOOK_HOST:
+            await dp.bot.set_webhook(
+                WEBHOOK_HOST.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                drop_pending_updates=True  # Пропускаем накопившиеся обновления
+            )
+            logger.info(f"Webhook установлен: {WEBHOOK_HOST}{WEBHOOK_PATH}")
+        await on_startup(dp)
+
+    app = web.Application()
+    app.router.add_get(HEALTH_PATH, health)
+
+    executor = Executor(dp)
+    executor.on_startup(startup, polling=False)
+    executor.on_shutdown(on_shutdown, polling=False)
+    executor.set_webhook(webhook_path=WEBHOOK_PATH, request_handler=SecretTokenRequestHandler, web_app=app)
+    executor.run_app(host=WEBAPP_HOST, port=WEBAPP_PORT)